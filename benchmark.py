@@ -0,0 +1,546 @@
+"""
+Офлайн-бенчмарк fedstat_api на локальном сервере-заглушке вместо fedstat.ru.
+
+Заглушка отдает страницу индикатора (блок filters, построенный по справочникам
+выгрузки) и ответы data.do в формате SDMX или Excel. Исходные данные - example.xml
+из репозитория; для масштабов 10, 100, ... таблица размножается (копии получают
+новые типы поселения), после чего заново сериализуется в SDMX и Excel.
+
+Для каждого формата и масштаба в отдельном процессе замеряются:
+    filters           - загрузка и разбор страницы индикатора (_filters_raw)
+    load              - запрос data.do и разбор ответа (load_raw_indicator)
+    preprocess, remove_districts, change_districts, mid_year - шаги обработки
+    combine           - путь "мужчины + женщины": fill_missing_years и combine_sum
+а также пиковый объем памяти процесса.
+
+С --check вместо замеров выполняются проверки корректности на заглушке, отвечающей
+только выбранными значениями фильтров (selectedFilterIds), как fedstat.ru.
+
+Результаты дописываются в benchmark_results.jsonl вместе с хэшем коммита
+и сравниваются с последним замером другого коммита.
+
+Запуск:
+    python benchmark.py
+    python benchmark.py --formats sdmx --scales 1 10 --repeat 5
+    python benchmark.py --formats sdmx --scales 1000 --processes 4
+    python benchmark.py --check
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+from typing import Optional
+from multiprocessing import get_context
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+
+import fedstat_api as fa
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE = os.path.join(ROOT, "example.xml")
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmark_results.jsonl")
+MEN_ID, WOMEN_ID = 31548, 33459
+
+# Соответствие справочников SDMX кодам фильтров fedstat.ru
+CONCEPT_FILTERS = {
+    "s_OKATO": fa.REGION_FILTER,
+    "s_vozr": fa.AGE_FILTER,
+    "s_mest": fa.SETTLEMENT_FILTER,
+}
+LINE_OBJECT_IDS = [fa.REGION_FILTER, fa.AGE_FILTER, fa.SETTLEMENT_FILTER]
+STAGES = ["filters", "load"] + [stage for stage in fa.PROCESSING_STAGES if stage not in ("load", "impute")] + ["combine"]
+
+
+def read_code_lists(path: str) -> dict:
+    """
+    Читает справочники SDMX-файла: {id справочника: (название, {код: описание})}
+    """
+    tags = {name: fa._sdmx_tag("structure", name) for name in ["CodeList", "Name", "Code", "Description"]}
+    code_lists = {}
+    current, code = None, None
+    for event, elem in iterparse(path, events = ("start", "end")):
+        if event == "start":
+            if elem.tag == tags["CodeList"]:
+                current = elem.get("id")
+                code_lists[current] = ["", {}]
+            elif elem.tag == tags["Code"]:
+                code = elem.get("value")
+            continue
+        if elem.tag == tags["Name"] and current is not None and not code_lists[current][0]:
+            code_lists[current][0] = (elem.text or "").strip()
+        elif elem.tag == tags["Description"] and code is not None:
+            code_lists[current][1][code] = (elem.text or "").strip()
+        elif elem.tag == tags["Code"]:
+            code = None
+        elif elem.tag == tags["CodeList"]:
+            current = None
+            if len(code_lists) == len(CONCEPT_FILTERS):
+                break
+        elem.clear()
+    return {key: tuple(value) for key, value in code_lists.items()}
+
+
+class Fixture:
+    """
+    Ответы заглушки для одного масштаба: страница индикатора, SDMX и Excel
+    """
+
+    def __init__(self, codes: dict, concepts: dict, years: list, raw: Optional[pd.DataFrame] = None,
+                 sdmx_payload: Optional[bytes] = None):
+        """
+        :param codes: {столбец измерения: {название: код}}
+        :param concepts: {столбец измерения: (id справочника SDMX, код фильтра)}
+        :param years: годы (строки)
+        :param raw: таблица в виде load_raw_indicator (измерения, затем годы)
+        :param sdmx_payload: готовый SDMX-ответ (для example.xml)
+        """
+        self.codes = codes
+        self.concepts = concepts
+        self.years = years
+        self.raw = raw
+        self._payloads = {} if sdmx_payload is None else {"sdmx": sdmx_payload}
+
+    @classmethod
+    def from_example(cls, path: str = EXAMPLE) -> "Fixture":
+        """
+        Фикстура с example.xml: SDMX-ответ - сам файл, страница строится по его справочникам.
+        Таблица (raw) для Excel и масштабирования загружается через API методом attach_raw
+        """
+        codes, concepts = {}, {}
+        for key, (name, values) in read_code_lists(path).items():
+            if key in CONCEPT_FILTERS:
+                codes[name] = {label: code for code, label in values.items()}
+                concepts[name] = (key, CONCEPT_FILTERS[key])
+        with open(path, "rb") as file:
+            payload = file.read()
+        years = sorted(set(re.findall(r"<generic:Time>(\d{4})</generic:Time>", payload.decode("utf-8"))))
+        return cls(codes, concepts, years, sdmx_payload = payload)
+
+    def attach_raw(self, raw: pd.DataFrame):
+        """
+        Запоминает разобранную таблицу (метки измерений и коды берутся из нее)
+        """
+        self.raw = raw
+        self.codes = raw.attrs.get("dimension_codes", self.codes)
+
+    def scaled(self, scale: int) -> "Fixture":
+        """
+        Размножает таблицу в scale раз: копии получают новые типы поселения ("<тип> <номер>"),
+        названия регионов не меняются, поэтому отнесение к округам остается прежним
+        """
+        if scale == 1:
+            return self
+        settlement = self.raw.columns[2]
+        parts = []
+        settlement_codes = dict(self.codes[settlement])
+        for i in range(1, scale + 1):
+            part = self.raw.copy()
+            if i < scale:
+                part[settlement] = part[settlement].str.strip() + f" {i}"
+                settlement_codes.update({
+                    f"{label.strip()} {i}": f"{code}-{i}" for label, code in self.codes[settlement].items()
+                })
+            parts.append(part)
+        codes = dict(self.codes)
+        codes[settlement] = settlement_codes
+        return Fixture(codes, self.concepts, self.years, pd.concat(parts, ignore_index = True))
+
+    def select(self, filter_ids: list) -> "Fixture":
+        """
+        Фикстура с ответом на запрос selectedFilterIds: только выбранные годы и значения
+        фильтров (фильтр без выбранных значений не ограничивает выгрузку)
+        """
+        raw = self.raw
+        for col, (_, filter_code) in self.concepts.items():
+            selected = {value.split("_", 1)[1] for value in filter_ids if value.startswith(f"{filter_code}_")}
+            if selected:
+                raw = raw[raw[col].map(self.codes[col]).isin(selected)]
+        years = {value.split("_", 1)[1] for value in filter_ids if value.startswith(f"{fa.YEAR_FILTER}_")}
+        columns = [col for col in raw.columns if not str(col).isdigit() or not years or str(col) in years]
+        return Fixture(self.codes, self.concepts, self.years, raw[columns].reset_index(drop = True))
+
+    def _dimensions(self):
+        return [col for col in self.raw.columns if not str(col).isdigit()]
+
+    def page(self, indicator_id) -> bytes:
+        """
+        Страница индикатора с блоком filters в том виде, в каком его разбирает _extract_filters
+        """
+        filters = {"0": {"title": "Показатель", "values": {str(indicator_id): {"title": f"Индикатор {indicator_id}"}}}}
+        for col, (_, filter_code) in self.concepts.items():
+            filters[filter_code] = {
+                "title": col,
+                "values": {code: {"title": label} for label, code in self.codes[col].items()}
+            }
+        filters[fa.YEAR_FILTER] = {"title": "Год", "values": {year: {"title": year} for year in self.years}}
+        script = "grid({filters: " + json.dumps(filters, ensure_ascii = False) + ", left_columns: []});"
+        return f"<html><body><script>{script}</script></body></html>".encode("utf-8")
+
+    def sdmx(self) -> bytes:
+        """
+        Выгрузка в формате SDMX GenericData (ряд на каждое значение, как у fedstat.ru)
+        """
+        if "sdmx" in self._payloads:
+            return self._payloads["sdmx"]
+        dims = self._dimensions()
+        years = [col for col in self.raw.columns if str(col).isdigit()]
+        out = [
+            '<?xml version="1.0" encoding="utf-8"?>\n<GenericData'
+            ' xmlns="http://www.SDMX.org/resources/SDMXML/schemas/v1_0/message"'
+            ' xmlns:generic="http://www.SDMX.org/resources/SDMXML/schemas/v1_0/generic"'
+            ' xmlns:structure="http://www.SDMX.org/resources/SDMXML/schemas/v1_0/structure">\n<CodeLists>\n'
+        ]
+        for col in dims:
+            concept, _ = self.concepts[col]
+            out.append(f'<structure:CodeList id="{concept}"><structure:Name xml:lang="ru">{escape(col)}</structure:Name>\n')
+            for label, code in self.codes[col].items():
+                out.append(
+                    f'<structure:Code value={quoteattr(code)}><structure:Description xml:lang="ru">'
+                    f'{escape(label)}</structure:Description></structure:Code>\n'
+                )
+            out.append("</structure:CodeList>\n")
+        out.append("</CodeLists>\n<DataSet>\n")
+        keys = [
+            [f'<generic:Value concept="{self.concepts[col][0]}" value={quoteattr(self.codes[col][label])}/>'
+             for label in self.raw[col]]
+            for col in dims
+        ]
+        values = self.raw[years].to_numpy(dtype = "float64", na_value = np.nan)
+        for row in range(len(self.raw)):
+            series_key = "<generic:SeriesKey>" + "".join(key[row] for key in keys) + "</generic:SeriesKey>"
+            for j, year in enumerate(years):
+                value = values[row, j]
+                if value == value:
+                    out.append(
+                        f"<generic:Series>{series_key}<generic:Obs><generic:Time>{year}</generic:Time>"
+                        f'<generic:ObsValue value="{value:.0f}"/></generic:Obs></generic:Series>\n'
+                    )
+        out.append("</DataSet>\n</GenericData>\n")
+        self._payloads["sdmx"] = "".join(out).encode("utf-8")
+        return self._payloads["sdmx"]
+
+    def excel(self) -> bytes:
+        """
+        Выгрузка в формате Excel: 4 строки шапки, затем заголовок (пустой над измерениями) и данные
+        """
+        if "excel" in self._payloads:
+            return self._payloads["excel"]
+        from openpyxl import Workbook
+        workbook = Workbook(write_only = True)
+        sheet = workbook.create_sheet("Sheet1")
+        for line in ["Бенчмарк fedstat_api", "", "", ""]:
+            sheet.append([line])
+        dims = self._dimensions()
+        years = [col for col in self.raw.columns if str(col).isdigit()]
+        sheet.append([None] * len(dims) + years)
+        labels = self.raw[dims].to_numpy(dtype = object)
+        values = self.raw[years].to_numpy(dtype = "float64", na_value = np.nan)
+        for row in range(len(self.raw)):
+            sheet.append(list(labels[row]) + [None if value != value else int(value) for value in values[row]])
+        buffer = BytesIO()
+        workbook.save(buffer)
+        self._payloads["excel"] = buffer.getvalue()
+        return self._payloads["excel"]
+
+
+class StandInServer:
+    """
+    Локальная заглушка fedstat.ru: GET /indicator/<id> и POST /indicator/data.do.
+    При selective = True ответ data.do содержит только выбранные значения фильтров
+    (для замеров он выключен: ответ заранее сериализован целиком)
+    """
+
+    def __init__(self):
+        self.fixture = None
+        self.selective = False
+        self.posts = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body: bytes, content_type: str):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                indicator_id = self.path.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+                self._reply(server.fixture.page(indicator_id), "text/html; charset=utf-8")
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                filter_ids = urllib.parse.parse_qs(body).get("selectedFilterIds", [])
+                server.posts.append(filter_ids)
+                fixture = server.fixture.select(filter_ids) if server.selective else server.fixture
+                if "format=sdmx" in self.path:
+                    self._reply(fixture.sdmx(), "text/xml")
+                else:
+                    self._reply(fixture.excel(), "application/vnd.ms-excel")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+        threading.Thread(target = self._server.serve_forever, daemon = True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _run_case(base_url: str, data_type: str, repeat: int, processes: int = 0) -> dict:
+    """
+    Замеряет один формат/масштаб (выполняется в отдельном процессе)
+    """
+    transport = fa.FedStatTransport(base_url)
+    best = {}
+    rows = 0
+
+    def record(stage, seconds):
+        best[stage] = min(best.get(stage, float("inf")), seconds)
+
+    for _ in range(repeat):
+        def make_indicator(indicator_id):
+            return fa.FedStatIndicator(
+                indicator_id, cache = False, metadata_store = False,
+                transport = transport, single_flight = False
+            )
+
+        men = make_indicator(MEN_ID)
+        start = time.perf_counter()
+        men._filters_raw
+        record("filters", time.perf_counter() - start)
+
+        metrics = fa.MetricsCollector()
+        df_men = men.get_processed_data(data_type = data_type, observers = [metrics], processes = processes)
+        for event in metrics.events:
+            record(event["stage"], event["wall_time"])
+            if event["stage"] == "load":
+                rows = event["rows_out"]
+        women = make_indicator(WOMEN_ID)
+        df_women = women.process_raw(men._raw_data)
+
+        year_cols = [col for col in df_men.columns if col.endswith("end")]
+        holed = df_men.copy()
+        if len(year_cols) > 2:
+            holed.loc[holed.index % 3 == 0, year_cols[len(year_cols) // 2]] = pd.NA
+        start = time.perf_counter()
+        combined = fa.combine_sum(fa.fill_missing_years(holed, df_women), df_women)
+        record("combine", time.perf_counter() - start)
+
+    memory = fa._memory_snapshot()
+    total = sum(best.values())
+    return {
+        "rows": rows,
+        "output_rows": len(combined),
+        "bytes_downloaded": transport.bytes_downloaded // repeat,
+        "seconds": best,
+        "total_seconds": total,
+        "rows_per_second": rows / total if total else None,
+        "peak_rss": memory[1] if memory else None,
+    }
+
+
+def _git_revision() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd = ROOT, capture_output = True, text = True, check = True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd = ROOT, capture_output = True, text = True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = "unknown", False
+    return {"commit": commit, "dirty": dirty}
+
+
+def load_results(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding = "utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def compare(result: dict, history: list, threshold: float, min_seconds: float = 0.05) -> list:
+    """
+    Сравнивает замер с последним замером того же случая на другом коммите.
+    Рост времени меньше min_seconds секунд не считается регрессией: для шагов
+    в несколько миллисекунд относительный порог срабатывает на шуме
+    """
+    previous = [
+        item for item in history
+        if item["case"] == result["case"] and item["commit"] != result["commit"]
+    ]
+    if not previous:
+        return []
+    base = previous[-1]
+    lines = []
+    checks = [("total_seconds", "время"), ("peak_rss", "пиковая память")]
+    checks += [(stage, stage) for stage in result["seconds"]]
+    for key, label in checks:
+        old = base["seconds"].get(key) if key in result["seconds"] else base.get(key)
+        new = result["seconds"].get(key) if key in result["seconds"] else result.get(key)
+        if not old or new is None:
+            continue
+        change = new / old - 1
+        if key != "peak_rss" and new - old < min_seconds:
+            continue
+        if change > threshold:
+            lines.append(f"  РЕГРЕССИЯ {label}: {old:.4g} -> {new:.4g} (+{change:.0%}) относительно {base['commit'][:8]}")
+    return lines
+
+
+def _check_indicator(server: StandInServer, indicator_id: int) -> fa.FedStatIndicator:
+    return fa.FedStatIndicator(
+        indicator_id, cache = False, metadata_store = False,
+        transport = fa.FedStatTransport(server.base_url), single_flight = False
+    )
+
+
+def _frames_differ(name: str, left: pd.DataFrame, right: pd.DataFrame) -> list:
+    try:
+        pd.testing.assert_frame_equal(left, right)
+    except AssertionError as e:
+        return [f"{name}: {e}"]
+    return []
+
+
+def check_refresh(server: StandInServer, fixture: Fixture) -> list:
+    """
+    refresh панели, загруженной за часть лет, запрашивает только вышедшие после нее годы,
+    а результат совпадает с прямой загрузкой той же выборки
+    """
+    published, selected, new = fixture.years[:-2], fixture.years[-5:-2], fixture.years[-2:]
+    server.fixture = Fixture(fixture.codes, fixture.concepts, published, fixture.raw)
+    indicator = _check_indicator(server, MEN_ID)
+    year_ids = indicator.available_years()
+    common = [value for value in indicator.get_filter_values() if not value.startswith(f"{fa.YEAR_FILTER}_")]
+    indicator.get_processed_data(data_type = "sdmx", filter_ids = common + [year_ids[int(year)] for year in selected])
+
+    server.fixture = fixture
+    server.posts.clear()
+    refreshed = indicator.refresh(data_type = "sdmx")
+    problems = []
+    requested = [[value for value in post if value.startswith(f"{fa.YEAR_FILTER}_")] for post in server.posts]
+    expected_ids = [f"{fa.YEAR_FILTER}_{year}" for year in new]
+    if requested != [expected_ids]:
+        problems.append(f"refresh: запрошены годы {requested}, ожидались {expected_ids}")
+
+    direct = _check_indicator(server, MEN_ID)
+    year_ids = direct.available_years()
+    expected = direct.get_processed_data(
+        data_type = "sdmx", filter_ids = common + [year_ids[int(year)] for year in selected + new]
+    )
+    return problems + _frames_differ("refresh", refreshed, expected)
+
+
+def check_sharded(server: StandInServer, fixture: Fixture) -> list:
+    """
+    Загрузка частями по годам дает ту же таблицу (и тот же порядок строк), что и один запрос
+    """
+    server.fixture = fixture
+    expected = _check_indicator(server, MEN_ID).get_processed_data(data_type = "sdmx")
+    sharded = _check_indicator(server, MEN_ID).get_processed_data(
+        data_type = "sdmx", shard_by = fa.YEAR_FILTER, max_workers = 4
+    )
+    return _frames_differ("shard_by годам", sharded, expected)
+
+
+CHECKS = [check_refresh, check_sharded]
+
+
+def run_checks(server: StandInServer, fixture: Fixture) -> int:
+    """
+    Выполняет проверки корректности и печатает найденные расхождения; возвращает их число
+    """
+    server.selective = True
+    problems = 0
+    try:
+        for check in CHECKS:
+            lines = check(server, fixture)
+            problems += len(lines)
+            print(f"{check.__name__}: {'ОК' if not lines else 'ОШИБКА'}")
+            for line in lines:
+                print(f"  {line}")
+    finally:
+        server.selective = False
+        server.fixture = fixture
+    return problems
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Офлайн-бенчмарк fedstat_api")
+    parser.add_argument("--formats", nargs = "+", default = ["sdmx", "excel"], choices = ["sdmx", "excel"])
+    parser.add_argument("--scales", nargs = "+", type = int, default = [1, 10, 100])
+    parser.add_argument("--repeat", type = int, default = 3, help = "число повторов (берется лучшее время)")
+    parser.add_argument("--output", default = DEFAULT_OUTPUT, help = "файл с результатами (JSON Lines)")
+    parser.add_argument("--threshold", type = float, default = 0.1, help = "порог регрессии (доля)")
+    parser.add_argument("--min-seconds", type = float, default = 0.05,
+                        help = "минимальный рост времени шага, считающийся регрессией (с)")
+    parser.add_argument("--processes", type = int, default = 0, help = "число процессов обработки по регионам (0 - без них)")
+    parser.add_argument("--check", action = "store_true", help = "выполнить проверки корректности вместо замеров")
+    args = parser.parse_args(argv)
+
+    revision = _git_revision()
+    history = load_results(args.output)
+    base_fixture = Fixture.from_example()
+    server = StandInServer()
+    server.fixture = base_fixture
+    regressions = 0
+    try:
+        transport = fa.FedStatTransport(server.base_url)
+        base_fixture.attach_raw(fa.FedStatIndicator(
+            MEN_ID, cache = False, metadata_store = False, transport = transport, single_flight = False
+        ).load_raw_indicator(data_type = "sdmx"))
+        if args.check:
+            return 1 if run_checks(server, base_fixture) else 0
+        for scale in args.scales:
+            server.fixture = base_fixture.scaled(scale)
+            for data_type in args.formats:
+                payload = server.fixture.sdmx() if data_type == "sdmx" else server.fixture.excel()
+                with ProcessPoolExecutor(max_workers = 1, mp_context = get_context("spawn")) as pool:
+                    measured = pool.submit(_run_case, server.base_url, data_type, args.repeat, args.processes).result()
+                result = {
+                    "case": f"{data_type}-x{scale}" + (f"-p{args.processes}" if args.processes else ""),
+                    **revision,
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "payload_bytes": len(payload),
+                    **measured,
+                }
+                stages = " ".join(
+                    f"{stage}={result['seconds'][stage]:.3f}" for stage in STAGES if stage in result["seconds"]
+                )
+                peak = f"{result['peak_rss'] / 1024 ** 2:.0f} МБ" if result["peak_rss"] else "н/д"
+                print(
+                    f"{result['case']:>12}: {result['rows']} строк, {result['total_seconds']:.3f} с, "
+                    f"{result['rows_per_second']:.0f} строк/с, пик {peak}\n    {stages}"
+                )
+                lines = compare(result, history, args.threshold, args.min_seconds)
+                regressions += len(lines)
+                for line in lines:
+                    print(line)
+                with open(args.output, "a", encoding = "utf-8") as file:
+                    file.write(json.dumps(result, ensure_ascii = False) + "\n")
+    finally:
+        server.close()
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,1635 @@
 from typing import List, Optional 
+import os
 import re
+import sys
+import time
+import random
+import hashlib
+import shutil
+import threading
+import numpy as np
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 import json
-from io import BytesIO
-from functools import cached_property
+import logging
+from tempfile import SpooledTemporaryFile
+from array import array
+from functools import cached_property, lru_cache
+from types import MappingProxyType
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from xml.etree.ElementTree import iterparse
+from pandas.api.types import union_categoricals
+
+SDMX_NAMESPACES = {
+    "message": "http://www.SDMX.org/resources/SDMXML/schemas/v1_0/message",
+    "generic": "http://www.SDMX.org/resources/SDMXML/schemas/v1_0/generic",
+    "structure": "http://www.SDMX.org/resources/SDMXML/schemas/v1_0/structure"
+}
+
+def _sdmx_tag(prefix, name):
+    return f"{{{SDMX_NAMESPACES[prefix]}}}{name}"
+
+
+def _excel_engine(body) -> str:
+    """
+    Определяет движок для чтения Excel по сигнатуре файла: xlsx - zip-архив ("PK"), иначе xls
+    """
+    position = body.tell()
+    signature = body.read(2)
+    body.seek(position)
+    return "openpyxl" if signature == b"PK" else "xlrd"
+
+
+class TransportResponse:
+    """
+    Ответ транспорта: статус, заголовки и тело, сохраненное во временный файл
+    (в памяти до spool_size байт, затем на диске).
+    """
+
+    def __init__(self, status_code: int, headers, body, encoding: Optional[str] = None):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.encoding = encoding
+
+    @property
+    def content(self) -> bytes:
+        self.body.seek(0)
+        return self.body.read()
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors = "replace")
+
+    def close(self):
+        self.body.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FedStatTransport:
+    """
+    HTTP-транспорт для обращений к fedstat.ru.
+
+    Держит пул keep-alive соединений и cookie сессии (JSESSIONID),
+    повторяет запросы при временных ошибках с экспоненциальной задержкой
+    и случайным разбросом, а тело ответа потоково пишет во временный файл.
+    Базовый адрес можно заменить, например, на локальный тестовый сервер.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, base_url: str = "https://www.fedstat.ru", pool_size: int = 10, retries: int = 3,
+                 backoff: float = 1.0, timeout = (10, 600), spool_size: int = 16 * 1024 ** 2,
+                 chunk_size: int = 1024 ** 2):
+        """
+        :param base_url: адрес сайта без завершающего "/"
+        :param pool_size: число соединений, сохраняемых в пуле
+        :param retries: число повторов при временных ошибках
+        :param backoff: базовая задержка между повторами в секундах
+        :param timeout: таймауты (подключение, чтение) в секундах
+        :param spool_size: размер тела ответа, до которого оно хранится в памяти
+        :param chunk_size: размер блока при потоковом чтении ответа
+        """
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.spool_size = spool_size
+        self.chunk_size = chunk_size
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _sleep(self, attempt: int):
+        time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def request(self, method: str, path: str, **kwargs) -> TransportResponse:
+        """
+        Выполняет запрос и возвращает ответ с телом во временном файле
+
+        :param method: HTTP-метод
+        :param path: путь относительно base_url
+        """
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, url, stream = True, timeout = self.timeout, **kwargs)
+                with response:
+                    if response.status_code in self.RETRY_STATUSES and attempt < self.retries:
+                        self._sleep(attempt)
+                        continue
+                    response.raise_for_status()
+                    body = SpooledTemporaryFile(max_size = self.spool_size)
+                    size = 0
+                    try:
+                        for chunk in response.iter_content(chunk_size = self.chunk_size):
+                            body.write(chunk)
+                            size += len(chunk)
+                    except BaseException:
+                        body.close()
+                        raise
+                    body.seek(0)
+                with self._lock:
+                    self.bytes_downloaded += size
+                _count("bytes", size)
+                return TransportResponse(response.status_code, response.headers, body, response.encoding)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                if attempt == self.retries:
+                    raise
+                self._sleep(attempt)
+
+    def get(self, path: str, **kwargs) -> TransportResponse:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> TransportResponse:
+        return self.request("POST", path, **kwargs)
+
+
+_default_transport = None
+
+def get_default_transport() -> FedStatTransport:
+    """
+    Возвращает общий для всех индикаторов HTTP-транспорт
+    """
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = FedStatTransport()
+    return _default_transport
+
+def set_default_transport(transport: FedStatTransport):
+    """
+    Заменяет общий HTTP-транспорт (например, на транспорт к локальному серверу)
+    """
+    global _default_transport
+    _default_transport = transport
+
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "FEDSTAT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "fedstat")
+)
+
+
+class ResponseCache:
+    """
+    Дисковый кэш ответов data.do.
+
+    Хранит уже разобранные DataFrame в формате Parquet, ключ строится по
+    индикатору, формату и нормализованному набору фильтров. Записи старше
+    ttl считаются устаревшими, при превышении max_bytes вытесняются
+    давно не использованные записи (LRU).
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: Optional[float] = 24 * 60 * 60,
+                 max_bytes: int = 2 * 1024 ** 3):
+        """
+        :param cache_dir: каталог для хранения кэша
+        :param ttl: время жизни записи в секундах (None - бессрочно)
+        :param max_bytes: максимальный суммарный размер кэша в байтах
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok = True)
+        self._index = self._load_index()
+
+    @staticmethod
+    def make_key(indicator_id, data_type: str, lineObjectIds: List[str],
+                 columnObjectIds: List[str], filter_ids: List[str]) -> str:
+        """
+        Возвращает ключ кэша для запроса к data.do.
+        Порядок lineObjectIds/columnObjectIds задает раскладку таблицы и сохраняется,
+        набор выбранных фильтров сортируется и очищается от повторов.
+        """
+        payload = {
+            "id": str(indicator_id),
+            "format": data_type,
+            "lineObjectIds": [str(key) for key in lineObjectIds],
+            "columnObjectIds": [str(key) for key in columnObjectIds],
+            "selectedFilterIds": sorted(set(str(key) for key in filter_ids))
+        }
+        raw = json.dumps(payload, ensure_ascii = False, sort_keys = True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def _load_index(self) -> dict:
+        """
+        Читает индекс с диска. Записи без файла отбрасываются, файлы без записи
+        (например, если индекс был перезаписан другим процессом) добавляются
+        с временем создания по дате изменения файла.
+        """
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX_FILE), encoding = "utf-8") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            index = {}
+        index = {key: entry for key, entry in index.items() if os.path.exists(self._path(key))}
+        for name in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(name)
+            if ext == ".parquet" and key not in index:
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                index[key] = {"size": stat.st_size, "created": stat.st_mtime, "last_access": stat.st_mtime}
+        return index
+
+    def _index_lock(self) -> "_FileLock":
+        """
+        Межпроцессная блокировка индекса: каталог кэша могут использовать
+        одновременно несколько процессов (приложение, пакетная выгрузка)
+        """
+        return _FileLock(os.path.join(self.cache_dir, f"{self.INDEX_FILE}.lock"), stale = 60, poll = 0.05)
+
+    def _save_index(self):
+        path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding = "utf-8") as file:
+            json.dump(self._index, file)
+        os.replace(tmp_path, path)
+
+    def _remove(self, key: str):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        total = sum(entry["size"] for entry in self._index.values())
+        for key in sorted(self._index, key = lambda k: self._index[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._index[key]["size"]
+            self._remove(key)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        Возвращает DataFrame из кэша или None, если записи нет или она устарела
+        """
+        with self._lock:
+            now = time.time()
+            with self._index_lock():
+                self._index = self._load_index()
+                entry = self._index.get(key)
+                if entry is not None and self.ttl is not None and now - entry["created"] > self.ttl:
+                    self._remove(key)
+                    self._save_index()
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                _count("misses")
+                return None
+            try:
+                df = pd.read_parquet(self._path(key))
+            except (OSError, ValueError):
+                with self._index_lock():
+                    self._index = self._load_index()
+                    self._remove(key)
+                    self._save_index()
+                self.misses += 1
+                _count("misses")
+                return None
+            with self._index_lock():
+                self._index = self._load_index()
+                if key in self._index:
+                    self._index[key]["last_access"] = now
+                    self._save_index()
+            self.hits += 1
+            _count("hits")
+            return df
+
+    def put(self, key: str, df: pd.DataFrame):
+        """
+        Сохраняет DataFrame в кэш и вытесняет старые записи при превышении лимита
+        """
+        with self._lock:
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                df.to_parquet(tmp_path, index = False)
+            except (ImportError, ValueError, TypeError):
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return
+            with self._index_lock():
+                os.replace(tmp_path, path)
+                self._index = self._load_index()
+                now = time.time()
+                self._index[key] = {
+                    "size": os.path.getsize(path),
+                    "created": now,
+                    "last_access": now
+                }
+                self._evict()
+                self._save_index()
+
+    def clear(self):
+        """
+        Удаляет все записи кэша
+        """
+        with self._lock, self._index_lock():
+            self._index = self._load_index()
+            for key in list(self._index):
+                self._remove(key)
+            self._save_index()
+
+    def stats(self) -> dict:
+        """
+        Возвращает статистику попаданий и промахов кэша
+        """
+        with self._lock:
+            self._index = self._load_index()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": sum(entry["size"] for entry in self._index.values())
+            }
+
+
+_default_cache = None
+
+# Код фильтра с годами (периодами) на fedstat.ru
+YEAR_FILTER = "3"
+REGION_FILTER = "57831"
+AGE_FILTER = "58335"
+SETTLEMENT_FILTER = "58274"
+
+def get_default_cache() -> ResponseCache:
+    """
+    Возвращает общий для всех индикаторов кэш ответов
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
+
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых запросов.
+
+    Пока запрос с данным ключом выполняется, остальные вызовы do() с тем же
+    ключом не отправляют свой запрос, а ждут его завершения и получают тот же
+    результат (или то же исключение). Если задан lock_dir, запросы объединяются
+    и между процессами: выполняющий процесс держит файл блокировки "<ключ>.lock",
+    остальные ждут его удаления (результат они берут из общего дискового кэша).
+    """
+
+    def __init__(self, lock_dir: Optional[str] = None, stale: float = 30 * 60, poll: float = 0.5):
+        """
+        :param lock_dir: каталог для файлов блокировки (None - только внутри процесса)
+        :param stale: возраст файла блокировки в секундах, после которого он считается брошенным
+        :param poll: интервал проверки файла блокировки в секундах
+        """
+        self.lock_dir = lock_dir
+        self.stale = stale
+        self.poll = poll
+        self.shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+        if lock_dir is not None:
+            os.makedirs(lock_dir, exist_ok = True)
+
+    def do(self, key: str, func):
+        """
+        Выполняет func() один раз для всех одновременных вызовов с ключом key
+
+        :param key: ключ запроса (например, ResponseCache.make_key)
+        :param func: функция без аргументов, выполняющая запрос
+        :return: результат func (DataFrame ожидающим вызовам отдается неглубокой копией)
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = {"done": threading.Event(), "result": None, "error": None}
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight["done"].wait()
+            if flight["error"] is not None:
+                raise flight["error"]
+            result = flight["result"]
+            return result.copy(deep = False) if isinstance(result, pd.DataFrame) else result
+
+        try:
+            if self.lock_dir is None:
+                flight["result"] = func()
+            else:
+                with self._file_lock(key):
+                    flight["result"] = func()
+            return flight["result"]
+        except Exception as e:
+            flight["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight["done"].set()
+
+    def _file_lock(self, key: str):
+        return _FileLock(os.path.join(self.lock_dir, f"{key}.lock"), self.stale, self.poll)
+
+
+class _FileLock:
+    """
+    Межпроцессная блокировка на файле: создание с O_CREAT | O_EXCL
+    (работает одинаково в Windows и Linux), ожидание - опросом
+    """
+
+    def __init__(self, path: str, stale: float, poll: float):
+        self.path = path
+        self.stale = stale
+        self.poll = poll
+
+    def __enter__(self):
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                time.sleep(self.poll)
+                continue
+            with os.fdopen(fd, "w") as file:
+                file.write(str(os.getpid()))
+            return self
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+_default_single_flight = None
+
+def get_default_single_flight() -> SingleFlight:
+    """
+    Возвращает общий для всех индикаторов объединитель запросов (внутри процесса)
+    """
+    global _default_single_flight
+    if _default_single_flight is None:
+        _default_single_flight = SingleFlight()
+    return _default_single_flight
+
+def set_default_single_flight(single_flight: SingleFlight):
+    """
+    Заменяет общий объединитель запросов (например, на межпроцессный:
+    SingleFlight(lock_dir = DEFAULT_CACHE_DIR))
+    """
+    global _default_single_flight
+    _default_single_flight = single_flight
+
+
+_FILTERS_START = re.compile(r"\bfilters\s*:\s*\{")
+_BRACE_OR_QUOTE = re.compile(r"[{}'\"]")
+_STRING_END = {
+    "'": re.compile(r"(?:\\.|[^'\\])*'", re.DOTALL),
+    '"': re.compile(r'(?:\\.|[^"\\])*"', re.DOTALL)
+}
+
+def _extract_filters(page: str) -> dict:
+    """
+    Извлекает описание фильтров из HTML-страницы индикатора.
+
+    Вместо построения DOM-дерева ищет в тексте страницы начало блока
+    `filters: {` и находит его конец по балансу фигурных скобок
+    (с учетом строковых литералов), после чего приводит JS-объект к JSON.
+
+    :param page: текст HTML-страницы индикатора
+    :return: словарь фильтров
+    """
+    match = _FILTERS_START.search(page)
+    if match is None:
+        raise ValueError("На странице индикатора не найден блок фильтров")
+    start = match.end() - 1
+    pos = start
+    depth = 0
+    while True:
+        token = _BRACE_OR_QUOTE.search(page, pos)
+        if token is None:
+            raise ValueError("Блок фильтров на странице индикатора не закрыт")
+        char = token.group()
+        if char in "'\"":
+            string_end = _STRING_END[char].match(page, token.end())
+            if string_end is None:
+                raise ValueError("Блок фильтров на странице индикатора не закрыт")
+            pos = string_end.end()
+            continue
+        depth += 1 if char == "{" else -1
+        pos = token.end()
+        if depth == 0:
+            break
+
+    filters = '{"filters":' + page[start:pos] + "}"
+    filters = re.sub(r'([{,]\s*)(\w+)(\s*:)', r'\1"\2"\3', filters)
+    filters = filters.replace("'", '"')
+    return json.loads(filters)["filters"]
+
+
+class MetadataStore:
+    """
+    Локальное хранилище описаний фильтров индикаторов.
+
+    Разобранные фильтры сохраняются в JSON-файл для каждого индикатора
+    и дополнительно держатся в памяти процесса. Запись считается
+    свежей, пока с момента загрузки прошло не больше max_age секунд.
+    """
+
+    def __init__(self, store_dir: str = os.path.join(DEFAULT_CACHE_DIR, "metadata"),
+                 max_age: Optional[float] = 24 * 60 * 60):
+        """
+        :param store_dir: каталог для хранения метаданных
+        :param max_age: срок свежести записи в секундах (None - бессрочно)
+        """
+        self.store_dir = store_dir
+        self.max_age = max_age
+        self._memory = {}
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok = True)
+
+    def _path(self, indicator_id) -> str:
+        return os.path.join(self.store_dir, f"{indicator_id}.json")
+
+    def _is_fresh(self, fetched_at: float) -> bool:
+        return self.max_age is None or time.time() - fetched_at <= self.max_age
+
+    def get(self, indicator_id) -> Optional[dict]:
+        """
+        Возвращает фильтры индикатора или None, если записи нет или она устарела
+        """
+        key = str(indicator_id)
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is None:
+            try:
+                with open(self._path(key), encoding = "utf-8") as file:
+                    stored = json.load(file)
+                entry = (stored["fetched_at"], stored["filters"])
+            except (OSError, ValueError, KeyError):
+                return None
+            with self._lock:
+                self._memory[key] = entry
+        fetched_at, filters = entry
+        return filters if self._is_fresh(fetched_at) else None
+
+    def put(self, indicator_id, filters: dict):
+        """
+        Сохраняет фильтры индикатора
+        """
+        key = str(indicator_id)
+        fetched_at = time.time()
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding = "utf-8") as file:
+            json.dump({"fetched_at": fetched_at, "filters": filters}, file, ensure_ascii = False)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._memory[key] = (fetched_at, filters)
+
+    def invalidate(self, indicator_id):
+        """
+        Удаляет сохраненные фильтры индикатора
+        """
+        key = str(indicator_id)
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+_default_metadata_store = None
+
+def get_default_metadata_store() -> MetadataStore:
+    """
+    Возвращает общее для всех индикаторов хранилище метаданных
+    """
+    global _default_metadata_store
+    if _default_metadata_store is None:
+        _default_metadata_store = MetadataStore()
+    return _default_metadata_store
+
+
+class FilterDimension:
+    """
+    Справочник значений одного фильтра (измерения): коды значений ("57831_1792"),
+    их названия и прямой и обратный индексы.
+
+    Названия интернируются, справочники с одинаковым составом значений
+    (например, ОКАТО или возраст у разных индикаторов) строятся один раз
+    и используются всеми индикаторами совместно, поэтому их нельзя изменять.
+    """
+
+    # Общие справочники (LRU, не более MAX_INSTANCES)
+    MAX_INSTANCES = 256
+    _instances = {}
+    _lock = threading.Lock()
+
+    def __init__(self, code: str, title: str, ids: tuple, labels: tuple):
+        """
+        :param code: код фильтра
+        :param title: название фильтра
+        :param ids: коды значений в порядке фильтра на сайте
+        :param labels: названия значений
+        """
+        self.code = code
+        self.title = title
+        self.ids = ids
+        self.labels = labels
+        self.values = MappingProxyType(dict(zip(ids, labels)))
+        by_label = {}
+        for filter_id, label in zip(ids, labels):
+            by_label.setdefault(label, []).append(filter_id)
+        self._by_label = {label: tuple(matched) for label, matched in by_label.items()}
+
+    @classmethod
+    def get(cls, code: str, filter_raw: dict) -> "FilterDimension":
+        """
+        Возвращает справочник для фильтра из данных страницы индикатора (справочники переиспользуются)
+
+        :param code: код фильтра
+        :param filter_raw: {"title": ..., "values": {код: {"title": ...}}}
+        """
+        title = sys.intern(str(filter_raw["title"]))
+        ids = tuple(sys.intern(f"{code}_{key}") for key in filter_raw["values"])
+        labels = tuple(sys.intern(value["title"]) for value in filter_raw["values"].values())
+        key = (code, title, ids, labels)
+        with cls._lock:
+            dimension = cls._instances.pop(key, None)
+            if dimension is None:
+                dimension = cls(code, title, ids, labels)
+            cls._instances[key] = dimension
+            while len(cls._instances) > cls.MAX_INSTANCES:
+                cls._instances.pop(next(iter(cls._instances)))
+        return dimension
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, filter_id) -> bool:
+        return filter_id in self.values
+
+    def label(self, filter_id: str) -> str:
+        """
+        Возвращает название значения по его коду
+        """
+        return self.values[filter_id]
+
+    def ids_of(self, labels) -> List[str]:
+        """
+        Возвращает коды значений с названиями labels (в порядке labels)
+        """
+        ids = []
+        for label in labels:
+            matched = self._by_label.get(label)
+            if matched is None:
+                raise ValueError(f"Значение '{label}' не найдено в фильтре {self.code}")
+            ids.extend(matched)
+        return ids
+
+
+# Состав федеральных округов: двузначные префиксы кодов ОКАТО субъектов
+# и шаблоны названий для случаев, когда код неизвестен (Excel-выгрузка).
+FEDERAL_DISTRICTS = {
+    'Центральный федеральный округ': {
+        "okato": ["14", "15", "17", "20", "24", "29", "34", "38", "42", "45",
+                  "46", "54", "61", "66", "68", "28", "70", "78"],
+        "names": [
+            r'Белгород', r'Брянск', r'Владимир', r'Воронеж', r'Иванов',
+            r'Калуж', r'Костром', r'Курская', r'Липецк', r'Москва',
+            r'Московская', r'Орлов', r'Рязан', r'Смолен', r'Тамбов',
+            r'Тверск', r'Тульск', r'Ярослав']
+    },
+    'Северо-Западный федеральный округ': {
+        "okato": ["86", "87", "11", "19", "27", "41", "47", "49", "58", "40"],
+        "names": [
+            r'Карелия', r'Республика Коми', r'^Архангельская область$', r'Вологод',
+            r'Калининград', r'Ленинград', r'Мурманск', r'Новгородская',
+            r'Псков', r'Санкт-Петербург']
+    },
+    'Южный федеральный округ': {
+        "okato": ["79", "85", "35", "03", "12", "18", "60", "67"],
+        "names": [
+            r'Адыгея', 
+            r'Калмыкия',
+            r'Краснодарский',
+            r'Астраханская',
+            r'Волгоградская',
+            r'Ростовская',
+            r'Крым',
+            r'Севастополь']
+    },
+    'Северо-Кавказский федеральный округ': {
+        "okato": ["82", "26", "83", "91", "90", "96", "07"],
+        "names": [
+            r'Дагестан',
+            r'Ингушетия',
+            r'Кабардин',
+            r'Балкар',
+            r'Карачаев',
+            r'Черкес',
+            r'Осетия',
+            r'Алания',
+            r'Чечен',
+            r'Ставрополь']
+    },
+    'Приволжский федеральный округ': {
+        "okato": ["80", "88", "89", "92", "94", "97", "57", "33", "22", "53",
+                  "56", "36", "63", "73"],
+        "names": [
+            r'Башкортостан', r'Марий', r'Мордов', r'Татарстан', r'Удмурт',
+            r'Чуваш', r'Пермск', r'Киров', r'Нижегородск', r'Оренбург',
+            r'Пензенск', r'Самарск', r'Саратов', r'Ульянов']
+    },
+    'Уральский федеральный округ': {
+        "okato": ["37", "65", "71", "75"],
+        "names": [r'Курган', r'Свердлов', r'^Тюменская область$', r'Челябин']
+    },
+    'Сибирский федеральный округ': {
+        "okato": ["84", "93", "95", "01", "04", "25", "32", "50", "52", "69"],
+        "names": [
+            r'Алтай',
+            r'Тыва',
+            r'Хакасия',
+            r'Красноярский',
+            r'Иркутская',
+            r'Кемеровская',
+            r'Кузбасс',
+            r'Новосибирская',
+            r'(?<!Костр)Омская',
+            r'Томская']
+    },
+    'Дальневосточный федеральный округ': {
+        "okato": ["81", "76", "98", "30", "05", "08", "10", "44", "64", "99", "77"],
+        "names": [
+            r'Бурятия',
+            r'Забайкал',
+            r'Саха',
+            r'Якутия',
+            r'Камчат',
+            r'Приморск',
+            r'Хабаровский',
+            r'Амурская',
+            r'Магаданская',
+            r'Сахалинская',
+            r'Еврейская автономная область',
+            r'Чукотский автономный округ']
+    }
+}
+
+# Округа, которые пересчитываются по умолчанию
+DEFAULT_DISTRICTS = {
+    name: FEDERAL_DISTRICTS[name] for name in [
+        'Дальневосточный федеральный округ',
+        'Сибирский федеральный округ',
+        'Южный федеральный округ',
+        'Северо-Кавказский федеральный округ'
+    ]
+}
+
+
+# Территории, входящие в состав другого субъекта (например, "... (Красноярский край)"):
+# их значения уже учтены в субъекте и при агрегации не суммируются повторно.
+_PART_OF_SUBJECT = re.compile(r"входящ\w* в состав|\([^()]*\b(?:край|края|область|области)\)\s*$", re.IGNORECASE)
+
+
+class DistrictIndex:
+    """
+    Индекс "регион -> округ".
+
+    Каждая уникальная метка региона сопоставляется с округом один раз:
+    по коду ОКАТО субъекта (11 знаков, из которых значимы первые два),
+    а если код неизвестен - по шаблонам названий. Строки таблицы получают
+    номер округа через коды категорий, без повторных regex-проходов по столбцу.
+    """
+
+    # Индексы для разных составов округов (LRU, не более MAX_INSTANCES)
+    MAX_INSTANCES = 32
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, districts: dict):
+        """
+        :param districts: словарь {название округа: {"okato": [...], "names": [...]}}
+        """
+        self.names = list(districts.keys())
+        self._okato = {
+            prefix: i for i, config in enumerate(districts.values())
+            for prefix in config.get("okato", [])
+        }
+        self._patterns = [
+            re.compile('|'.join(config.get("names", [])), flags = re.IGNORECASE) if config.get("names") else None
+            for config in districts.values()
+        ]
+        self._district_pattern = re.compile(
+            '|'.join(re.escape(name.split(" округ")[0]) for name in self.names),
+            flags = re.IGNORECASE
+        )
+        self._by_name = {}
+        self._by_code = {}
+
+    @classmethod
+    def get(cls, districts: Optional[dict] = None) -> "DistrictIndex":
+        """
+        Возвращает индекс для заданного состава округов (индексы переиспользуются)
+        """
+        districts = DEFAULT_DISTRICTS if districts is None else districts
+        key = json.dumps(districts, ensure_ascii = False, sort_keys = True)
+        with cls._instances_lock:
+            index = cls._instances.pop(key, None)
+            if index is None:
+                index = cls(districts)
+            cls._instances[key] = index
+            while len(cls._instances) > cls.MAX_INSTANCES:
+                cls._instances.pop(next(iter(cls._instances)))
+        return index
+
+    @staticmethod
+    def _normalize(label: str) -> str:
+        return re.sub(r"\s+", " ", label.replace("ё", "е").replace("Ё", "Е")).strip()
+
+    def _lookup_name(self, label) -> int:
+        district = self._by_name.get(label)
+        if district is None:
+            district = -1
+            if isinstance(label, str) and not _PART_OF_SUBJECT.search(label):
+                name = self._normalize(label)
+                for i, pattern in enumerate(self._patterns):
+                    if pattern is not None and pattern.search(name):
+                        district = i
+                        break
+            self._by_name[label] = district
+        return district
+
+    def _lookup_code(self, code: str) -> int:
+        district = self._by_code.get(code)
+        if district is None:
+            is_subject = len(code) == 11 and code.isdigit() and code[2:] == "000000000"
+            district = self._okato.get(code[:2], -1) if is_subject else -1
+            self._by_code[code] = district
+        return district
+
+    def assign(self, regions: pd.Series, okato: Optional[dict] = None) -> np.ndarray:
+        """
+        Возвращает номер округа (позиция в names) для каждой строки, -1 - вне округов
+
+        :param regions: столбец с названиями регионов
+        :param okato: соответствие "название региона -> код ОКАТО", если известно
+        """
+        codes, labels = pd.factorize(regions)
+        okato = okato or {}
+        table = np.empty(len(labels) + 1, dtype = np.int64)
+        table[-1] = -1
+        for i, label in enumerate(labels):
+            code = okato.get(label)
+            if code is None and isinstance(label, str):
+                code = okato.get(label.strip())
+            table[i] = self._lookup_code(code) if code is not None else self._lookup_name(label)
+        return table[codes]
+
+    def district_of(self, label) -> int:
+        """
+        Возвращает номер округа, агрегатом которого является метка label, -1 - если не является
+        """
+        if isinstance(label, str) and self._district_pattern.search(label):
+            for i, name in enumerate(self.names):
+                if re.search(re.escape(name.split(" округ")[0]), label, flags = re.IGNORECASE):
+                    return i
+        return -1
+
+    def district_rows(self, regions: pd.Series) -> np.ndarray:
+        """
+        Возвращает маску строк, которые сами являются агрегатами по округам из индекса
+        """
+        codes, labels = pd.factorize(regions)
+        table = np.array(
+            [isinstance(label, str) and self._district_pattern.search(label) is not None for label in labels] + [False]
+        )
+        return table[codes]
+
+
+def _map_categories(column: pd.Series, func) -> pd.Series:
+    """
+    Применяет функцию к категориям столбца (а не к каждой строке).
+    Категории, ставшие одинаковыми после преобразования, объединяются.
+    """
+    column = column.astype("category")
+    new_labels = pd.Index([func(label) for label in column.cat.categories], dtype = object)
+    codes, uniques = pd.factorize(new_labels)
+    old_codes = column.cat.codes.to_numpy()
+    new_codes = np.where(old_codes >= 0, np.append(codes, -1)[old_codes], -1)
+    categories = pd.Index(uniques, dtype = object)
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories = categories), index = column.index, name = column.name)
+
+
+def _interpolate_gaps(values: np.ndarray, years: np.ndarray) -> np.ndarray:
+    """
+    Линейно интерполирует пропуски (NaN) внутри каждой строки по оси лет.
+    Пропуски до первого и после последнего известного значения не заполняются.
+
+    :param values: массив строки x годы
+    :param years: годы, соответствующие столбцам
+    :return: новый массив с заполненными пропусками
+    """
+    values = np.array(values, dtype = "float64")
+    n_rows, n_cols = values.shape
+    if not n_cols:
+        return values
+    columns = np.arange(n_cols)
+    valid = ~np.isnan(values)
+    previous = np.maximum.accumulate(np.where(valid, columns, -1), axis = 1)
+    following = np.minimum.accumulate(np.where(valid, columns, n_cols)[:, ::-1], axis = 1)[:, ::-1]
+    inner = ~valid & (previous >= 0) & (following < n_cols)
+    rows, cols = np.nonzero(inner)
+    x = np.asarray(years, dtype = "float64")
+    x0, x1 = x[previous[rows, cols]], x[following[rows, cols]]
+    y0, y1 = values[rows, previous[rows, cols]], values[rows, following[rows, cols]]
+    values[rows, cols] = y0 + (y1 - y0) * (x[cols] - x0) / (x1 - x0)
+    return values
+
+
+def _carry_forward(values: np.ndarray) -> np.ndarray:
+    """
+    Переносит последнее известное значение каждой строки вперед по оси лет.
+    Пропуски до первого известного значения не заполняются.
+
+    :param values: массив строки x годы
+    :return: новый массив с заполненными пропусками
+    """
+    values = np.array(values, dtype = "float64")
+    valid = ~np.isnan(values)
+    previous = np.maximum.accumulate(np.where(valid, np.arange(values.shape[1]), -1), axis = 1)
+    rows, cols = np.nonzero(~valid & (previous >= 0))
+    values[rows, cols] = values[rows, previous[rows, cols]]
+    return values
+
+
+def _fill_by_ratio(values: np.ndarray, reference: np.ndarray, years: np.ndarray) -> np.ndarray:
+    """
+    Заполняет пропуски по индикатору-ориентиру: отношение values / reference
+    линейно интерполируется по годам, пропуск заменяется на reference * отношение.
+
+    :param values: массив строки x годы с пропусками
+    :param reference: значения ориентира в той же раскладке
+    :param years: годы, соответствующие столбцам
+    :return: новый массив с заполненными пропусками
+    """
+    values = np.array(values, dtype = "float64")
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        ratio = np.where(reference != 0, values / reference, np.nan)
+    ratio = _interpolate_gaps(ratio, years)
+    fill = np.isnan(values) & ~np.isnan(reference) & ~np.isnan(ratio)
+    values[fill] = (reference * ratio)[fill]
+    return values
+
+
+class IndicatorPanel:
+    """
+    Компактное внутреннее представление данных индикатора.
+
+    Измерения (регион, возраст, тип поселения, ...) хранятся в категориальных
+    столбцах dims - по одной строке на ряд, годы - целочисленной осью years,
+    значения - одним непрерывным массивом values (ряды x годы, float64, NaN - нет данных).
+    Широкая таблица со столбцами "Yend"/"Ymid" строится только на выходе (to_frame).
+    """
+
+    def __init__(self, dims: pd.DataFrame, years: np.ndarray, values: np.ndarray, attrs: Optional[dict] = None):
+        """
+        :param dims: столбцы измерений (по строке на ряд)
+        :param years: годы, по возрастанию
+        :param values: значения, массив размера len(dims) x len(years)
+        :param attrs: дополнительные сведения (например, коды измерений из SDMX)
+        """
+        self.dims = dims.reset_index(drop = True)
+        self.years = np.asarray(years, dtype = np.int64)
+        self.values = np.ascontiguousarray(values, dtype = np.float64)
+        self.attrs = dict(attrs or {})
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "IndicatorPanel":
+        """
+        Строит панель из широкой таблицы: столбцы-годы ("1990", "1991", ...) и измерения
+        """
+        years = sorted((col for col in df.columns if col.isdigit()), key = int)
+        dims = pd.DataFrame({
+            col: df[col].astype("category") for col in df.columns if not col.isdigit()
+        })
+        values = df[years].to_numpy(dtype = "float64", na_value = np.nan)
+        return cls(dims, [int(year) for year in years], values, df.attrs)
+
+    def __len__(self) -> int:
+        return len(self.dims)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Объем памяти, занимаемый панелью, в байтах
+        """
+        return int(self.values.nbytes + self.dims.memory_usage(index = False, deep = True).sum())
+
+    def take(self, rows) -> "IndicatorPanel":
+        """
+        Возвращает панель из выбранных рядов (индексы или булева маска)
+        """
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        return IndicatorPanel(self.dims.iloc[rows], self.years, self.values[rows], self.attrs)
+
+    @classmethod
+    def concat(cls, panels: List["IndicatorPanel"]) -> "IndicatorPanel":
+        """
+        Объединяет панели по рядам; оси лет объединяются, отсутствующие значения - NaN
+        """
+        years = np.unique(np.concatenate([panel.years for panel in panels]))
+        columns = list(dict.fromkeys(col for panel in panels for col in panel.dims.columns))
+        dims = {}
+        for col in columns:
+            parts = [
+                panel.dims[col] if col in panel.dims else pd.Series(pd.Categorical([np.nan] * len(panel)))
+                for panel in panels
+            ]
+            dims[col] = pd.Series(union_categoricals([pd.Categorical(part) for part in parts]))
+        values = np.full((sum(len(panel) for panel in panels), len(years)), np.nan)
+        start = 0
+        for panel in panels:
+            values[start:start + len(panel), np.searchsorted(years, panel.years)] = panel.values
+            start += len(panel)
+        attrs = dict(panels[0].attrs)
+        dimension_codes = {}
+        for panel in panels:
+            for col, codes in panel.attrs.get("dimension_codes", {}).items():
+                dimension_codes.setdefault(col, {}).update(codes)
+        if dimension_codes:
+            attrs["dimension_codes"] = dimension_codes
+        return cls(pd.DataFrame(dims), years, values, attrs)
+
+    def merge_years(self, other: "IndicatorPanel") -> "IndicatorPanel":
+        """
+        Объединяет панели по ключу измерений: ряды с одинаковым ключом сливаются,
+        непустые значения other заменяют значения этой панели, новые ряды добавляются в конец
+        """
+        combined = IndicatorPanel.concat([self, other])
+        group = combined.dims.groupby(
+            list(combined.dims.columns), sort = False, observed = True, dropna = False
+        ).ngroup().to_numpy()
+        n_groups = group.max() + 1 if len(group) else 0
+        _, first = np.unique(group, return_index = True)
+        values = np.full((n_groups, len(combined.years)), np.nan)
+        for part in [slice(0, len(self)), slice(len(self), None)]:
+            part_values = combined.values[part]
+            rows, cols = np.nonzero(~np.isnan(part_values))
+            values[group[part][rows], cols] = part_values[rows, cols]
+        return IndicatorPanel(combined.dims.iloc[first], combined.years, values, combined.attrs)
+
+    def values_like(self, other: "IndicatorPanel") -> np.ndarray:
+        """
+        Возвращает значения панели other в раскладке этой панели: ряды сопоставляются
+        по ключу измерений (по позиции столбцов), годы - по оси лет; отсутствующее - NaN
+        """
+        n_keys = min(len(self.dims.columns), len(other.dims.columns))
+        own_key = pd.MultiIndex.from_arrays([self.dims.iloc[:, i].to_numpy(dtype = object) for i in range(n_keys)])
+        other_key = pd.MultiIndex.from_arrays([other.dims.iloc[:, i].to_numpy(dtype = object) for i in range(n_keys)])
+        if not other_key.is_unique:
+            raise ValueError("Ключ измерений панели-ориентира не уникален")
+        rows = other_key.get_indexer(own_key)
+        cols = np.searchsorted(other.years, self.years)
+        cols = np.where((cols < len(other.years)) & (other.years[np.minimum(cols, len(other.years) - 1)] == self.years), cols, -1)
+        padded = np.full((len(other) + 1, len(other.years) + 1), np.nan)
+        padded[:-1, :-1] = other.values
+        return padded[rows[:, None], cols[None, :]]
+
+    def fill_gaps(self, method: str = "linear", reference: Optional["IndicatorPanel"] = None) -> "IndicatorPanel":
+        """
+        Заполняет пропуски во всем блоке значений по годам.
+        Столбцы "Ymid" строятся при выводе, поэтому для заполненных лет они пересчитываются сами.
+
+        :param method: "linear" - линейная интерполяция между известными годами,
+                       "ffill" - перенос последнего известного значения вперед,
+                       "ratio" - по индикатору-ориентиру reference (интерполируется отношение к нему)
+        :param reference: панель индикатора-ориентира для method = "ratio"
+        :return: новая панель с заполненными пропусками
+        """
+        if method == "linear":
+            values = _interpolate_gaps(self.values, self.years)
+        elif method == "ffill":
+            values = _carry_forward(self.values)
+        elif method == "ratio":
+            if reference is None:
+                raise ValueError("Для заполнения по отношению нужен индикатор-ориентир (reference)")
+            values = _fill_by_ratio(self.values, self.values_like(reference), self.years)
+        else:
+            raise ValueError(f"Неизвестный способ заполнения пропусков: {method}")
+        return IndicatorPanel(self.dims, self.years, values, self.attrs)
+
+    @classmethod
+    def from_output(cls, df: pd.DataFrame) -> "IndicatorPanel":
+        """
+        Строит панель из итоговой таблицы (результата to_frame): значения берутся из столбцов "Yend"
+        """
+        value_columns = [col for col in df.columns if _VALUE_COLUMN.match(str(col))]
+        end_columns = [col for col in value_columns if str(col).endswith("end")]
+        dims = pd.DataFrame({
+            col: df[col].astype("category") for col in df.columns if col not in value_columns
+        })
+        values = df[end_columns].to_numpy(dtype = "float64", na_value = np.nan)
+        return cls(dims, [int(str(col)[:4]) for col in end_columns], values, df.attrs)
+
+    @classmethod
+    def from_long(cls, df: pd.DataFrame) -> "IndicatorPanel":
+        """
+        Строит панель из длинной таблицы со столбцами измерений, "year" и "value"
+        """
+        dim_columns = [col for col in df.columns if col not in ("year", "value")]
+        dims = pd.DataFrame({col: df[col].astype("category") for col in dim_columns})
+        group = dims.groupby(dim_columns, sort = False, observed = True, dropna = False).ngroup().to_numpy()
+        n_groups = group.max() + 1 if len(group) else 0
+        _, first = np.unique(group, return_index = True)
+        years = np.unique(df["year"].to_numpy(dtype = np.int64))
+        values = np.full((n_groups, len(years)), np.nan)
+        values[group, np.searchsorted(years, df["year"].to_numpy(dtype = np.int64))] = df["value"].to_numpy(dtype = "float64")
+        return cls(dims.iloc[first], years, values, df.attrs)
+
+    def to_parquet(self, path: str):
+        """
+        Сохраняет панель в Parquet-файл (в длинном формате, вместе с attrs)
+        """
+        long = self.to_long(dropna = False)
+        long.attrs = self.attrs
+        long.to_parquet(path, index = False)
+
+    @classmethod
+    def read_parquet(cls, path: str) -> "IndicatorPanel":
+        """
+        Загружает панель, сохраненную методом to_parquet
+        """
+        return cls.from_long(pd.read_parquet(path))
+
+    def to_long(self, dropna: bool = True, with_row: bool = False) -> pd.DataFrame:
+        """
+        Возвращает длинную таблицу: измерения, год, значение
+
+        :param dropna: отбрасывать ли пропущенные значения
+        :param with_row: добавить столбец "row" с номером ряда панели (для восстановления порядка)
+        """
+        n_rows, n_years = self.values.shape
+        rows = np.repeat(np.arange(n_rows), n_years)
+        flat = self.values.reshape(-1)
+        present = ~np.isnan(flat) if dropna else np.ones(len(flat), dtype = bool)
+        rows = rows[present]
+        data = {
+            col: pd.Categorical.from_codes(self.dims[col].cat.codes.to_numpy()[rows], dtype = self.dims[col].dtype)
+            for col in self.dims.columns
+        }
+        data["year"] = np.tile(self.years, n_rows)[present]
+        data["value"] = flat[present]
+        if with_row:
+            data["row"] = rows
+        return pd.DataFrame(data)
+
+    def to_frame(self, mid_year: bool = True) -> pd.DataFrame:
+        """
+        Возвращает широкую таблицу: измерения, затем по каждому году "Ymid" и "Yend".
+
+        "Ymid" - среднее между годами Y-1 и Y (если год Y-1 есть), все средние
+        считаются одной операцией над блоком значений. Столбцы "Yend" имеют тип
+        Int64, если все значения целые, иначе Float64.
+
+        :param mid_year: добавлять ли столбцы "Ymid"
+        """
+        columns = {col: self.dims[col].to_numpy(dtype = object) for col in self.dims.columns}
+        missing = np.isnan(self.values)
+        finite = self.values[~missing]
+        integral = bool(np.all(finite == np.round(finite))) if finite.size else True
+
+        current, previous = [], []
+        if mid_year:
+            position = {year: i for i, year in enumerate(self.years)}
+            for i, year in enumerate(self.years):
+                if year - 1 in position:
+                    current.append(i)
+                    previous.append(position[year - 1])
+        mids = (self.values[:, current] + self.values[:, previous]) / 2
+        mid_columns = dict(zip(current, range(len(current))))
+
+        for i, year in enumerate(self.years):
+            if i in mid_columns:
+                mid = mids[:, mid_columns[i]]
+                columns[f"{year}mid"] = pd.arrays.FloatingArray(mid, np.isnan(mid))
+            if integral:
+                data = np.where(missing[:, i], 0, self.values[:, i]).astype(np.int64)
+                columns[f"{year}end"] = pd.arrays.IntegerArray(data, missing[:, i].copy())
+            else:
+                columns[f"{year}end"] = pd.arrays.FloatingArray(self.values[:, i].copy(), missing[:, i].copy())
+        return pd.DataFrame(columns)
+
+
+DEFAULT_DATASET_DIR = os.environ.get("FEDSTAT_DATASET_DIR", os.path.join(DEFAULT_CACHE_DIR, "datasets"))
+
+
+class DatasetStore:
+    """
+    Локальное хранилище обработанных индикаторов: Parquet-датасет, разбитый
+    по индикатору и году (root/indicator_id=<код>/year=<год>/*.parquet).
+
+    Данные хранятся в длинном формате (измерения, год, значение, номер ряда;
+    пропуски сохраняются, чтобы не терять ряды без значений),
+    рядом лежит _meta.json с порядком измерений и attrs панели. При чтении
+    отбор по годам затрагивает только нужные каталоги, отбор по регионам
+    и возрастам выполняется при чтении файлов.
+    """
+
+    META_FILE = "_meta.json"
+
+    def __init__(self, root: str = DEFAULT_DATASET_DIR):
+        """
+        :param root: каталог датасета
+        """
+        self.root = root
+        os.makedirs(root, exist_ok = True)
+
+    def _path(self, indicator_id) -> str:
+        return os.path.join(self.root, f"indicator_id={indicator_id}")
+
+    def __contains__(self, indicator_id) -> bool:
+        return os.path.exists(os.path.join(self._path(indicator_id), self.META_FILE))
+
+    def write(self, indicator_id, panel: IndicatorPanel):
+        """
+        Сохраняет панель индикатора, заменяя ранее сохраненную
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        path = self._path(indicator_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        long = panel.to_long(dropna = False, with_row = True)
+        long["row"] = long["row"].astype(np.int32)
+        ds.write_dataset(
+            pa.Table.from_pandas(long, preserve_index = False),
+            tmp_path,
+            format = "parquet",
+            partitioning = ["year"],
+            partitioning_flavor = "hive",
+            existing_data_behavior = "delete_matching"
+        )
+        meta = {
+            "dimensions": list(panel.dims.columns),
+            "years": panel.years.tolist(),
+            "rows": len(panel),
+            "attrs": panel.attrs,
+            "written_at": time.time()
+        }
+        with open(os.path.join(tmp_path, self.META_FILE), "w", encoding = "utf-8") as file:
+            json.dump(meta, file, ensure_ascii = False, default = str)
+
+        old_path = f"{tmp_path}.old"
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path, ignore_errors = True)
+
+    def meta(self, indicator_id) -> dict:
+        """
+        Возвращает сведения о сохраненном индикаторе (измерения, годы, attrs)
+        """
+        with open(os.path.join(self._path(indicator_id), self.META_FILE), encoding = "utf-8") as file:
+            return json.load(file)
+
+    def read(self, indicator_id, years: Optional[List[int]] = None, regions: Optional[List[str]] = None,
+             ages: Optional[List[str]] = None) -> IndicatorPanel:
+        """
+        Читает сохраненную панель с отбором по годам, регионам и возрастам
+
+        :param indicator_id: код индикатора
+        :param years: годы (читаются только их каталоги); None - все
+        :param regions: названия регионов; None - все
+        :param ages: метки возрастов; None - все
+        :return: IndicatorPanel
+        """
+        import pyarrow.dataset as ds
+
+        if indicator_id not in self:
+            raise KeyError(f"Индикатор {indicator_id} не сохранен в {self.root}")
+        meta = self.meta(indicator_id)
+        dimensions = meta["dimensions"]
+        dataset = ds.dataset(self._path(indicator_id), format = "parquet", partitioning = "hive")
+
+        condition = None
+        for column, values in [("year", years), (dimensions[0], regions), (dimensions[1], ages)]:
+            if values is None:
+                continue
+            values = [int(value) for value in values] if column == "year" else [str(value).strip() for value in values]
+            expression = ds.field(column).isin(values)
+            condition = expression if condition is None else condition & expression
+
+        long = dataset.to_table(columns = dimensions + ["year", "value", "row"], filter = condition).to_pandas()
+        long = long.sort_values(["row", "year"], kind = "stable").drop(columns = "row").reset_index(drop = True)
+        long.attrs = meta.get("attrs", {})
+        return IndicatorPanel.from_long(long)
+
+
+_default_dataset_store = None
+
+def get_default_dataset_store() -> DatasetStore:
+    """
+    Возвращает общее хранилище обработанных индикаторов
+    """
+    global _default_dataset_store
+    if _default_dataset_store is None:
+        _default_dataset_store = DatasetStore()
+    return _default_dataset_store
+
+
+PROCESSING_STAGES = ("load", "partitions", "preprocess", "remove_districts", "impute", "change_districts", "mid_year")
+
+
+def _memory_snapshot():
+    """
+    Возвращает (текущий, пиковый) объем памяти процесса в байтах или None, если psutil не установлен
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    peak = getattr(info, "peak_wset", None)
+    if peak is None:
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        except ImportError:
+            peak = info.rss
+    return info.rss, peak
+
+
+# Счетчики шагов PipelineRun, выполняющихся в текущем потоке (шаги могут быть вложенными)
+_stage_local = threading.local()
+_stage_lock = threading.Lock()
+_active_stages = {}
+
+
+def _count(name: str, value: int = 1):
+    """
+    Добавляет value к счетчику name шагов, выполняющихся в текущем потоке
+    (транспорт считает скачанные байты, кэш ответов - попадания и промахи)
+    """
+    stack = getattr(_stage_local, "stack", None)
+    if stack:
+        with _stage_lock:
+            for counters in stack:
+                counters[name] += value
+
+
+def _current_counters() -> list:
+    return list(getattr(_stage_local, "stack", None) or [])
+
+
+@contextmanager
+def _counting(stack: list):
+    """
+    Выполняет блок with со счетчиками шагов stack в текущем потоке
+    (так загрузки в других потоках учитываются в шаге, который их запустил)
+    """
+    previous = getattr(_stage_local, "stack", None)
+    _stage_local.stack = stack
+    try:
+        yield
+    finally:
+        _stage_local.stack = previous
+
+
+class PipelineObserver:
+    """
+    Наблюдатель за шагами обработки индикатора.
+
+    stage_started получает событие {"indicator_id", "stage", "rows_in"};
+    stage_finished - то же событие, дополненное замерами: wall_time (с), rows_out,
+    bytes_downloaded, cache_hits и cache_misses (только запросы самого шага),
+    memory_delta и peak_memory_delta (байты памяти процесса; None без psutil или если
+    в других потоках одновременно выполнялись другие шаги), error (текст исключения или None).
+    """
+
+    def stage_started(self, event: dict):
+        pass
+
+    def stage_finished(self, event: dict):
+        pass
+
+
+class _ProgressObserver(PipelineObserver):
+    """
+    Передает названия начинающихся шагов в функцию progress(stage)
+    """
+
+    def __init__(self, progress):
+        self.progress = progress
+
+    def stage_started(self, event: dict):
+        self.progress(event["stage"])
+
+
+class MetricsCollector(PipelineObserver):
+    """
+    Накапливает замеры завершенных шагов (например, для выгрузки в систему метрик)
+    """
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def stage_finished(self, event: dict):
+        with self._lock:
+            self.events.append(dict(event))
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Возвращает замеры в виде таблицы: строка на шаг
+        """
+        with self._lock:
+            return pd.DataFrame(self.events)
+
+    def summary(self) -> dict:
+        """
+        Возвращает суммарные время, скачанные байты и число попаданий в кэш по шагам
+        """
+        totals = {}
+        with self._lock:
+            for event in self.events:
+                total = totals.setdefault(event["stage"], {"count": 0, "wall_time": 0.0, "bytes_downloaded": 0, "cache_hits": 0})
+                total["count"] += 1
+                total["wall_time"] += event["wall_time"]
+                total["bytes_downloaded"] += event["bytes_downloaded"] or 0
+                total["cache_hits"] += event["cache_hits"] or 0
+        return totals
+
+
+class StageLog(PipelineObserver):
+    """
+    Структурированный журнал шагов: по JSON-строке на завершенный шаг
+    в файл path или, если путь не задан, в logging-логгер "fedstat_api"
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def stage_finished(self, event: dict):
+        line = json.dumps(event, ensure_ascii = False, default = str)
+        if self.path is None:
+            logging.getLogger("fedstat_api").info(line)
+            return
+        with self._lock:
+            with open(self.path, "a", encoding = "utf-8") as file:
+                file.write(line + "\n")
+
+
+class PipelineRun:
+    """
+    Замеряет шаги обработки одного индикатора и сообщает о них наблюдателям
+    """
+
+    def __init__(self, indicator, observers: Optional[List[PipelineObserver]] = None, progress = None):
+        """
+        :param indicator: FedStatIndicator
+        :param observers: наблюдатели
+        :param progress: функция progress(stage) - сокращение для наблюдателя, получающего начало шагов
+        """
+        self.indicator = indicator
+        self.observers = list(observers or [])
+        if progress:
+            self.observers.append(_ProgressObserver(progress))
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None):
+        """
+        Выполняет шаг name внутри блока with; в блоке можно задать event["rows_out"]
+        """
+        if not self.observers:
+            yield {}
+            return
+        event = {"indicator_id": self.indicator.id, "stage": name, "rows_in": rows_in, "rows_out": None}
+        for observer in self.observers:
+            observer.stage_started(event)
+        # Байты и обращения к кэшу считаются по запросам этого шага; память - общая для
+        # процесса, поэтому ее разница не сообщается, если шаги шли одновременно в разных потоках
+        counters = {"bytes": 0, "hits": 0, "misses": 0, "overlap": False}
+        thread = threading.get_ident()
+        with _stage_lock:
+            for other_thread, other in _active_stages.values():
+                if other_thread != thread:
+                    other["overlap"] = counters["overlap"] = True
+            _active_stages[id(counters)] = (thread, counters)
+        before = _memory_snapshot()
+        start = time.perf_counter()
+        error = None
+        try:
+            with _counting(_current_counters() + [counters]):
+                yield event
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            after = _memory_snapshot()
+            with _stage_lock:
+                _active_stages.pop(id(counters), None)
+            memory = (after[0] - before[0], after[1] - before[1]) \
+                if before and after and not counters["overlap"] else (None, None)
+            event.update({
+                "wall_time": time.perf_counter() - start,
+                "bytes_downloaded": counters["bytes"],
+                "memory_delta": memory[0],
+                "peak_memory_delta": memory[1],
+                "cache_hits": counters["hits"],
+                "cache_misses": counters["misses"],
+                "error": None if error is None else str(error)
+            })
+            for observer in self.observers:
+                observer.stage_finished(event)
+
 
 class FedStatIndicator:
-    def __init__(self, indicator_id):
+    def __init__(self, indicator_id, cache: Optional[ResponseCache] = None,
+                 metadata_store: Optional[MetadataStore] = None,
+                 transport: Optional[FedStatTransport] = None,
+                 single_flight: Optional[SingleFlight] = None):
+        """
+        :param indicator_id: код индикатора на fedstat.ru
+        :param cache: кэш ответов data.do; по умолчанию общий дисковый кэш, False - без кэша
+        :param metadata_store: хранилище фильтров; по умолчанию общее, False - без хранилища
+        :param transport: HTTP-транспорт; по умолчанию общий для всех индикаторов
+        :param single_flight: объединитель одинаковых запросов; по умолчанию общий, False - без объединения
+        """
         self.id = indicator_id
         self._raw_data = None
+        self._filter_ids = None
+        self._panel = None
+        self._transport = transport
+        self.cache = get_default_cache() if cache is None else cache
+        self.metadata_store = get_default_metadata_store() if metadata_store is None else metadata_store
+        self.single_flight = get_default_single_flight() if single_flight is None else single_flight
+
+    @property
+    def transport(self) -> FedStatTransport:
+        return self._transport or get_default_transport()
 
     @cached_property
     def _filters_raw(self):
         """Получает сырые данные фильтров"""
-        html = requests.get(f'https://www.fedstat.ru/indicator/{self.id}')
-        if html.status_code == 200:
-            soup = BeautifulSoup(html.text, "lxml")
-            script = soup.find_all("script")[11].text
-            pattern = r"filters:\s*(\{.*?\})(?=\s*,\s*left_columns)"
-            match = re.search(pattern, script, re.DOTALL).group(0)
-            filters = "{" + match + "}"
-            filters = re.sub(r'([{,]\s*)(\w+)(\s*:)', r'\1"\2"\3', filters)
-            filters = filters.replace("'", '"')
-            filters_raw = json.loads(filters)['filters']
-            return filters_raw
-        else:
-            raise requests.RequestException(f"Ошибка HTTP-запроса")
+        if self.metadata_store:
+            filters_raw = self.metadata_store.get(self.id)
+            if filters_raw is not None:
+                return filters_raw
+        try:
+            with self.transport.get(f"/indicator/{self.id}") as html:
+                filters_raw = _extract_filters(html.text)
+        except requests.RequestException as e:
+            raise requests.RequestException(f"Ошибка HTTP-запроса: {str(e)}")
+        if self.metadata_store:
+            self.metadata_store.put(self.id, filters_raw)
+        return filters_raw
+
+    @cached_property
+    def filter_catalog(self) -> dict:
+        """
+        Возвращает справочники фильтров индикатора: {код фильтра: FilterDimension}
+        """
+        return {
+            key: FilterDimension.get(key, self._filters_raw[key])
+            for key in list(self._filters_raw.keys())[1:]
+        }
 
     @cached_property
     def filter_codes(self):
@@ -35,7 +1637,7 @@ class FedStatIndicator:
         Возвращает код и название показателя, доступного для фильтрации
         """
         
-        filter_codes = {key : self._filters_raw[key]['title'] for key in list(self._filters_raw.keys())[1:]}
+        filter_codes = {key : dimension.title for key, dimension in self.filter_catalog.items()}
         return filter_codes
 
     @cached_property
@@ -49,46 +1651,91 @@ class FedStatIndicator:
         """
         Возвращает названия и коды доступных значений для выбранных фильтров
         """
-        filters = self._filters_raw
-        filter_codes = self.filter_codes
-        
-        categories =[]
-        for key in filter_codes.keys():
-            categories.append({
-                key: list(filters[key]['values'].keys())
-            })
-        filter_ids = [f"{k}_{val}" for item in categories for k, v in item.items() for val in v]
-        return filter_ids
+        return [filter_id for dimension in self.filter_catalog.values() for filter_id in dimension.ids]
         
     @cached_property     
     def filter_categories(self):
-        result_dict = {}
-        for category in self.filter_codes.keys():
-            values_data = self._filters_raw[category]['values']
-            result_dict[category] = {f"{category}_{k}": v['title'] for k, v in values_data.items()}
-        return result_dict
+        """
+        Возвращает значения фильтров: {код фильтра: {код значения: название}} (только для чтения)
+        """
+        return {key: dimension.values for key, dimension in self.filter_catalog.items()}
 
-    def load_raw_indicator(self, data_type: str = "excel", filter_ids: List["str"] =  None):
+    def load_raw_indicator(self, data_type: str = "excel", filter_ids: List["str"] =  None,
+                           shard_by: Optional[str] = None, shard_size: Optional[int] = None,
+                           max_workers: int = 4, retries: int = 3):
         """
        Загружает данные индикатора через API
 
-       :param data_type: тип возвращаемых данных
+       :param data_type: тип возвращаемых данных ("excel" или "sdmx")
        :param filter_ids: список с кодами выбранных показателей
+       :param shard_by: код фильтра, по значениям которого запрос делится на части
+                        (например, "57831" - регионы или "3" - годы); None - один запрос
+       :param shard_size: число значений фильтра shard_by в одной части
+                          (по умолчанию значения делятся поровну между потоками)
+       :param max_workers: число одновременно загружаемых частей
+       :param retries: число попыток загрузки каждой части
        :return: DataFrame с данными
         """
 
         if self._raw_data is not None:
             return self._raw_data
 
-        if filter_ids is None:
-            filter_ids = self.get_filter_values()
+        if filter_ids is None:
+            filter_ids = self.get_filter_values()
+        self._filter_ids = filter_ids
+
+        lineObjectIds, columnObjectIds = self._request_layout()
+        request_key = ResponseCache.make_key(self.id, data_type, lineObjectIds, columnObjectIds, filter_ids)
+
+        def download():
+            if self.cache:
+                cached = self.cache.get(request_key)
+                if cached is not None:
+                    return cached
+            if shard_by is None:
+                raw_data = self._fetch(data_type, filter_ids, lineObjectIds, columnObjectIds)
+            else:
+                raw_data = self._fetch_sharded(
+                    data_type, filter_ids, lineObjectIds, columnObjectIds,
+                    shard_by, shard_size, max_workers, retries
+                )
+            if self.cache:
+                self.cache.put(request_key, raw_data)
+            return raw_data
+
+        if self.single_flight:
+            self._raw_data = self.single_flight.do(request_key, download)
+        else:
+            self._raw_data = download()
+        return self._raw_data
 
-        columnObjectIds = ["30611", "33560", "3"]
-        lineObjectIds = ["57831", "58335"]
+    def _request_layout(self):
+        """
+        Возвращает раскладку таблицы: коды фильтров в строках и в столбцах
+        """
+        columnObjectIds = [key for key in ["30611", "33560", YEAR_FILTER] if key in self.filter_codes]
+        lineObjectIds = [key for key in [REGION_FILTER, AGE_FILTER] if key in self.filter_codes]
         for key in self.filter_codes.keys():
             if key not in columnObjectIds + lineObjectIds:
                 lineObjectIds.append(key)
+        return lineObjectIds, columnObjectIds
+
+    def _rename_columns(self, raw_data, lineObjectIds: List[str]):
+        """
+        Переименовывает безымянные столбцы Excel-выгрузки в названия фильтров
+        """
+        for col in raw_data.columns:
+            if "Unnamed" in col:
+                index = int(col.split(' ')[1])
+                col_index = lineObjectIds[index]
+                new_col = self.filter_codes.get(col_index)
+                raw_data.rename(columns = {col: new_col}, inplace = True)
+        return raw_data
 
+    def _fetch(self, data_type: str, filter_ids: List[str], lineObjectIds: List[str], columnObjectIds: List[str]):
+        """
+        Выполняет один запрос к data.do и разбирает ответ
+        """
         data = {
                 "lineObjectIds": lineObjectIds,
                 "columnObjectIds": columnObjectIds,
@@ -101,25 +1748,244 @@ class FedStatIndicator:
             "id" : self.id  
         }
         try: 
-            response = requests.post("https://www.fedstat.ru/indicator/data.do?", params = params, data = data)
-            response.raise_for_status()
-            if "excel" in response.headers.get("Content-Type"):
-                raw_data = pd.read_excel(BytesIO(response.content), engine = "xlrd", header = 4) 
-                for col in raw_data.columns:
-                    if "Unnamed" in col:
-                        index = int(col.split(' ')[1])
-                        col_index = lineObjectIds[index]
-                        new_col = self.filter_codes.get(col_index)
-                        raw_data.rename(columns = {col: new_col}, inplace = True)
-                self._raw_data = raw_data
-                return self._raw_data
-            else:
-                raise ValueError(
-                    f"Ответ не содержит {data_type} файла"
-                )
+            with self.transport.post("/indicator/data.do", params = params, data = data) as response:
+                content_type = response.headers.get("Content-Type", "")
+                if "excel" in content_type or "spreadsheet" in content_type:
+                    raw_data = pd.read_excel(response.body, engine = _excel_engine(response.body), header = 4)
+                    return self._rename_columns(raw_data, lineObjectIds)
+                elif "xml" in content_type:
+                    return self._read_sdmx(response.body, lineObjectIds)
+                else:
+                    raise ValueError(
+                        f"Ответ не содержит {data_type} файла"
+                    )
         except requests.RequestException as e:
             raise requests.RequestException(f"Ошибка HTTP-запроса: {str(e)}")
 
+    def _fetch_sharded(self, data_type: str, filter_ids: List[str], lineObjectIds: List[str],
+                       columnObjectIds: List[str], shard_by: str, shard_size: Optional[int],
+                       max_workers: int, retries: int):
+        """
+        Делит запрос на части по значениям фильтра shard_by, загружает их
+        параллельно и собирает результат в исходном порядке строк и столбцов.
+        Каждая часть загружается повторно при ошибке, не затрагивая остальные.
+        """
+        prefix = f"{shard_by}_"
+        shard_values = [value for value in filter_ids if value.startswith(prefix)]
+        common = [value for value in filter_ids if not value.startswith(prefix)]
+        if not shard_values:
+            raise ValueError(f"Среди выбранных значений нет значений фильтра {shard_by}")
+
+        if shard_size is None:
+            shard_size = -(-len(shard_values) // max(max_workers, 1))
+        shards = [shard_values[i:i + shard_size] for i in range(0, len(shard_values), shard_size)]
+
+        counters = _current_counters()
+
+        def fetch_shard(values):
+            for attempt in range(retries):
+                try:
+                    with _counting(counters):
+                        return self._fetch(data_type, common + values, lineObjectIds, columnObjectIds)
+                except (requests.RequestException, ValueError):
+                    if attempt == retries - 1:
+                        raise
+                    time.sleep(2 ** attempt)
+
+        with ThreadPoolExecutor(max_workers = max_workers) as executor:
+            parts = list(executor.map(fetch_shard, shards))
+
+        dimension_codes = {}
+        for part in parts:
+            for column, codes in part.attrs.get("dimension_codes", {}).items():
+                dimension_codes.setdefault(column, {}).update(codes)
+
+        if shard_by not in columnObjectIds:
+            raw_data = pd.concat(parts, ignore_index = True)
+            raw_data.attrs["dimension_codes"] = dimension_codes
+            return raw_data
+
+        dims = [col for col in parts[0].columns if not str(col).isdigit()]
+        indexed = []
+        for part in parts:
+            part = part.copy()
+            part["_occurrence"] = part.groupby(dims, sort = False, dropna = False).cumcount()
+            indexed.append(part.set_index(dims + ["_occurrence"]))
+        # Ряды, которых нет в части (например, без данных за ее годы), встают на свое место
+        # по соседним рядам других частей, а не в конец таблицы
+        index = pd.MultiIndex.from_tuples(
+            _merge_order([part.index for part in indexed]), names = dims + ["_occurrence"]
+        )
+        merged = pd.concat([part.reindex(index) for part in indexed], axis = 1)
+        raw_data = merged.reset_index().drop(columns = "_occurrence")
+        raw_data.attrs["dimension_codes"] = dimension_codes
+        return raw_data
+
+    def _read_sdmx(self, source, lineObjectIds: List[str]):
+        """
+        Потоково разбирает SDMX (GenericData) ответ в DataFrame того же вида,
+        что и Excel-выгрузка: столбцы измерений в порядке lineObjectIds, затем годы.
+
+        Элементы generic:Series очищаются сразу после разбора, значения
+        накапливаются в компактных массивах, поэтому пиковая память
+        не зависит от размера XML-документа.
+
+        :param source: путь к файлу или файловый объект с SDMX-документом
+        :param lineObjectIds: коды фильтров, выводимых в строках
+        :return: DataFrame с данными
+        """
+        code_lists = {}
+        concept_names = {}
+        concepts = None
+        key_index = {}
+        time_index = {}
+        rows = array("q")
+        times = array("q")
+        values = array("d")
+
+        current_list = None
+        series_key = []
+        in_series_key = False
+        dataset = None
+
+        codelist_tag = _sdmx_tag("structure", "CodeList")
+        name_tag = _sdmx_tag("structure", "Name")
+        code_tag = _sdmx_tag("structure", "Code")
+        description_tag = _sdmx_tag("structure", "Description")
+        dataset_tag = _sdmx_tag("message", "DataSet")
+        series_tag = _sdmx_tag("generic", "Series")
+        series_key_tag = _sdmx_tag("generic", "SeriesKey")
+        value_tag = _sdmx_tag("generic", "Value")
+        obs_tag = _sdmx_tag("generic", "Obs")
+        time_tag = _sdmx_tag("generic", "Time")
+        obs_value_tag = _sdmx_tag("generic", "ObsValue")
+
+        for event, elem in iterparse(source, events = ("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == codelist_tag:
+                    current_list = elem.get("id")
+                    code_lists[current_list] = {}
+                elif tag == series_key_tag:
+                    in_series_key = True
+                    series_key = []
+                elif tag == dataset_tag:
+                    dataset = elem
+                continue
+
+            if tag == value_tag:
+                if in_series_key:
+                    series_key.append((elem.get("concept"), elem.get("value")))
+            elif tag == series_key_tag:
+                in_series_key = False
+                if concepts is None:
+                    concepts = [concept for concept, _ in series_key]
+                key = tuple(code for _, code in series_key)
+                row = key_index.setdefault(key, len(key_index))
+            elif tag == obs_tag:
+                time = elem.findtext(time_tag)
+                obs_value = elem.find(obs_value_tag)
+                value = obs_value.get("value") if obs_value is not None else None
+                try:
+                    value = float(value.replace(",", "."))
+                except (AttributeError, ValueError):
+                    value = np.nan
+                rows.append(row)
+                times.append(time_index.setdefault(time.strip(), len(time_index)))
+                values.append(value)
+                elem.clear()
+            elif tag == series_tag:
+                elem.clear()
+                if dataset is not None:
+                    dataset.clear()
+            elif tag == code_tag and current_list is not None:
+                code_lists[current_list][elem.get("value")] = (elem.findtext(description_tag) or "").strip()
+                elem.clear()
+            elif tag == name_tag and current_list is not None and current_list not in concept_names:
+                concept_names[current_list] = (elem.text or "").strip()
+            elif tag == codelist_tag:
+                current_list = None
+                elem.clear()
+
+        if concepts is None:
+            raise ValueError("SDMX-ответ не содержит данных")
+
+        concept_columns = {}
+        titles = {
+            self.filter_codes.get(key, "").strip().lower(): key
+            for key in lineObjectIds if key in self.filter_codes
+        }
+        for concept in concepts:
+            name = concept_names.get(concept, concept)
+            key = titles.get(name.strip().lower())
+            concept_columns[concept] = (lineObjectIds.index(key) if key else len(lineObjectIds),
+                                        self.filter_codes.get(key, name))
+        ordered = sorted(range(len(concepts)), key = lambda i: concept_columns[concepts[i]][0])
+
+        keys = list(key_index.keys())
+        data = {}
+        dimension_codes = {}
+        for i in ordered:
+            concept = concepts[i]
+            labels = code_lists.get(concept, {})
+            column = concept_columns[concept][1]
+            data[column] = [labels.get(key[i], key[i]) for key in keys]
+            dimension_codes[column] = {labels.get(code, code): code for code in set(key[i] for key in keys)}
+
+        time_labels = sorted(time_index, key = lambda t: (not t.isdigit(), int(t) if t.isdigit() else 0, t))
+        position = np.empty(len(time_index), dtype = np.int64)
+        for new_pos, label in enumerate(time_labels):
+            position[time_index[label]] = new_pos
+
+        matrix = np.full((len(keys), len(time_labels)), np.nan)
+        matrix[np.frombuffer(rows, dtype = np.int64), position[np.frombuffer(times, dtype = np.int64)]] = np.frombuffer(values)
+        for j, label in enumerate(time_labels):
+            data[label] = matrix[:, j]
+        raw_data = pd.DataFrame(data)
+        raw_data.attrs["dimension_codes"] = dimension_codes
+        return raw_data
+
+    # Разобранные метки возраста общие для всех индикаторов, так как метки повторяются между ними;
+    # размер ограничен, чтобы в долгоживущем процессе память не росла без предела.
+    AGE_LABELS_CACHE_SIZE = 4096
+
+    @classmethod
+    @lru_cache(maxsize = AGE_LABELS_CACHE_SIZE)
+    def _parse_age_label(cls, label) -> tuple:
+        """
+        Разбирает метку возраста: (min_age, max_age, age_category)
+        """
+        min_age = cls._get_min_age(label)
+        max_age = cls._get_max_age(label)
+        return (
+            np.nan if min_age is None else min_age,
+            np.nan if max_age is None else max_age,
+            cls._categorize_age(label)
+        )
+
+    @classmethod
+    def _age_lookup(cls, ages: pd.Series):
+        """
+        Разбирает столбец с возрастом: каждая уникальная метка разбирается один раз,
+        результат раздается строкам по кодам категорий.
+
+        :param ages: столбец с метками возраста
+        :return: массивы min_age, max_age (float, NaN если чисел нет) и age_category
+        """
+        if isinstance(ages.dtype, pd.CategoricalDtype):
+            codes = ages.cat.codes.to_numpy()
+            labels = ages.cat.categories
+        else:
+            codes, labels = pd.factorize(ages)
+
+        table = np.empty((len(labels) + 1, 3))
+        table[-1] = (np.nan, np.nan, 4)
+        for i, label in enumerate(labels):
+            table[i] = cls._parse_age_label(label)
+
+        rows = table[codes]
+        return rows[:, 0], rows[:, 1], rows[:, 2].astype(np.int64)
+
     @staticmethod
     def _get_min_age(age_str):
         numbers = re.findall(r'\d+', age_str)
@@ -144,137 +2010,310 @@ class FedStatIndicator:
         else:
             return 4
     
-    def _preprocess_dataframe(self, df):
+    def reload_metadata(self):
+        """
+        Сбрасывает сохраненные фильтры индикатора, чтобы при следующем обращении загрузить их с сайта
+        """
+        if self.metadata_store:
+            self.metadata_store.invalidate(self.id)
+        for name in ["_filters_raw", "filter_catalog", "filter_codes", "filter_categories", "indicator_title"]:
+            self.__dict__.pop(name, None)
+
+    def query(self, **conditions) -> "IndicatorQuery":
+        """
+        Создает ленивый запрос к индикатору (см. IndicatorQuery); данные загружаются при вызове collect()
+
+        :param conditions: regions, years, ages, settlements, filters, mid_year, districts
+        """
+        return IndicatorQuery(self, **conditions)
+
+    def available_years(self) -> dict:
+        """
+        Возвращает опубликованные годы по данным фильтров: {год: код значения фильтра}
+        """
+        years = {}
+        for filter_id, title in self.filter_categories.get(YEAR_FILTER, {}).items():
+            match = re.search(r"\d{4}", str(title))
+            if match:
+                years[int(match.group())] = filter_id
+        return years
+
+    def refresh(self, path: Optional[str] = None, data_type: str = "excel", districts: Optional[dict] = None):
+        """
+        Догружает только новые периоды и добавляет их к уже загруженным данным.
+
+        Годы, которые уже есть в данных (в памяти или в файле path), сравниваются
+        с годами из свежих метаданных; запрашиваются только годы после последнего
+        загруженного с тем же набором остальных фильтров. Агрегаты по округам считаются только
+        для новых лет, значения на середину года строятся при выводе.
+        Если данных еще нет, выполняется полная загрузка.
 
-        df.iloc[:, 0] = df.iloc[:, 0].str.strip()
-        years = [col for col in df.columns if col.isdigit()]
-        df[years] = df[years].astype("Int64")
-         
-        df.iloc[:, 1] = df.iloc[:, 1].str.replace(r'\s*(лет|года|год)$', '', regex = True).str.strip()
+        :param path: Parquet-файл с ранее сохраненными данными (обновляется после загрузки)
+        :param data_type: Формат загружаемых данных
+        :param districts: Состав пересчитываемых округов
+        :return: pandas.DataFrame с итоговыми данными
+        """
+        panel = self._panel
+        if panel is None and path is not None and os.path.exists(path):
+            panel = IndicatorPanel.read_parquet(path)
+        if panel is None:
+            result = self.get_processed_data(data_type = data_type, districts = districts)
+            if path is not None:
+                self._panel.to_parquet(path)
+            return result
+
+        self.reload_metadata()
+        available = self.available_years()
+        filter_ids = panel.attrs.get("filter_ids") or self.get_filter_values()
+        prefix = f"{YEAR_FILTER}_"
+        # Новыми считаются только годы после последнего загруженного или выбранного года:
+        # более ранние годы, не вошедшие в выборку, не догружаются
+        year_of = {filter_id: year for year, filter_id in available.items()}
+        held = panel.years.tolist() + [year_of[value] for value in filter_ids if value in year_of]
+        last_year = max(held, default = None)
+        missing = sorted(year for year in available if last_year is None or year > last_year)
+        if missing:
+            new_ids = [available[year] for year in missing]
+            delta_ids = [value for value in filter_ids if not value.startswith(prefix)] + new_ids
+
+            self._raw_data = None
+            raw_df = self.load_raw_indicator(data_type = data_type, filter_ids = delta_ids)
+            self._raw_data = None
+            delta = self._preprocess_dataframe(raw_df)
+            delta = self._remove_districts(delta, districts)
+            delta = self._change_districts(delta, districts)
+
+            panel = panel.merge_years(delta)
+            panel.attrs["filter_ids"] = list(filter_ids) + new_ids
+            if path is not None:
+                panel.to_parquet(path)
+
+        self._panel = panel
+        if panel.attrs.get("filter_ids"):
+            self._filter_ids = list(panel.attrs["filter_ids"])
+        return self._add_mid_year_values(panel)
+
+    def save_dataset(self, store: Optional[DatasetStore] = None):
+        """
+        Сохраняет обработанные данные (после get_processed_data или refresh) в локальный датасет
+
+        :param store: хранилище; по умолчанию общее (DEFAULT_DATASET_DIR)
+        """
+        if self._panel is None:
+            raise ValueError("Нет обработанных данных: сначала вызовите get_processed_data")
+        store = get_default_dataset_store() if store is None else store
+        store.write(self.id, self._panel)
+
+    def read_dataset(self, store: Optional[DatasetStore] = None, years: Optional[List[int]] = None,
+                     regions: Optional[List[str]] = None, ages: Optional[List[str]] = None,
+                     age_range: Optional[tuple] = None, columns: Optional[List[str]] = None,
+                     mid_year: bool = True) -> pd.DataFrame:
+        """
+        Читает сохраненные обработанные данные без обращения к сети.
+
+        Отбор по годам читает только каталоги нужных лет (и предыдущих - для "Ymid"),
+        отбор по регионам и возрастам выполняется при чтении файлов.
+
+        :param store: хранилище; по умолчанию общее
+        :param years: годы; None - все
+        :param regions: названия регионов (и пересчитанных округов); None - все
+        :param ages: метки возрастов ("0", "1", "5-9", ...); None - все
+        :param age_range: (от, до) - только возрастные группы, целиком лежащие в диапазоне
+        :param columns: столбцы результата (измерения и "Yend"/"Ymid"); годы из них
+                        добавляются к отбору years; None - все
+        :param mid_year: добавлять ли столбцы "Ymid"
+        :return: pandas.DataFrame в том же виде, что и get_processed_data
+        """
+        store = get_default_dataset_store() if store is None else store
+        if columns is not None:
+            column_years = {int(str(col)[:4]) for col in columns if _VALUE_COLUMN.match(str(col))}
+            if column_years:
+                years = sorted(set(years or []) | column_years)
+        read_years = None
+        if years is not None:
+            read_years = sorted(set(years) | ({year - 1 for year in years} if mid_year else set()))
+        panel = store.read(self.id, years = read_years, regions = regions, ages = ages)
+        if age_range is not None:
+            min_age, max_age, _ = self._age_lookup(panel.dims.iloc[:, 1])
+            panel = panel.take((min_age >= age_range[0]) & (max_age <= age_range[1]))
+        result = self._add_mid_year_values(panel, mid_year = mid_year)
+        if years is not None:
+            result = result.drop(columns = [
+                col for col in result.columns
+                if _VALUE_COLUMN.match(str(col)) and int(str(col)[:4]) not in years
+            ])
+        if columns is not None:
+            result = result[[col for col in result.columns if col in columns]]
+        return result
+
+    def _preprocess_dataframe(self, df, return_rows: bool = False):
+        """
+        Очищает выгрузку и переводит ее во внутреннее представление.
+        Строковые преобразования выполняются над категориями, а не над строками таблицы.
+        :param df: DataFrame, полученный из load_raw_indicator
+        :param return_rows: вернуть также номера оставшихся строк df
+        :return: IndicatorPanel (и массив номеров строк)
+        """
+        panel = IndicatorPanel.from_frame(df)
+        dims = panel.dims
+        region_col, age_col = dims.columns[0], dims.columns[1]
+        dims[region_col] = _map_categories(
+            dims[region_col],
+            lambda label: label.strip() if isinstance(label, str) else np.nan
+        )
+        dims[age_col] = _map_categories(
+            dims[age_col],
+            lambda label: re.sub(r'\s*(лет|года|год)$', '', label).strip() if isinstance(label, str) else np.nan
+        )
         subset_indices = [0, 1, 2]
-        df = df[~df.iloc[:, subset_indices].duplicated(keep = "last")]
-        
-        return df
+        keep = ~dims.iloc[:, subset_indices].duplicated(keep = "last").to_numpy()
+        if return_rows:
+            return panel.take(keep), np.flatnonzero(keep)
+        return panel.take(keep)
 
-    def _remove_districts(self, df):
+    def _remove_districts(self, panel, districts: Optional[dict] = None):
 
         """
         Удаляет федеральные округа из данных.
-        :param df: DataFrame, предварительно обработанный
-        :return: DataFrame без округов
+        :param panel: IndicatorPanel, предварительно обработанный
+        :param districts: округа, которые будут пересчитаны (по умолчанию DEFAULT_DISTRICTS)
+        :return: IndicatorPanel без округов
         """
         
-        rm_districts = '|'.join([
-            r'Южный федеральный',
-            r'Сибирский федеральный',
-            r'Северо-Кавказский федеральный',
-            r'Дальневосточный федеральный'
-        ])
-
-        districts_mask =df.iloc[:, 0].str.contains(rm_districts, case=False)
-        df = df[~districts_mask].copy().reset_index(drop = True)
-        return df
-
-    def _change_districts(self, df):
+        index = DistrictIndex.get(districts)
+        districts_mask = index.district_rows(panel.dims.iloc[:, 0])
+        return panel.take(~districts_mask)
+
+    def _impute_missing(self, panel, impute: Optional[str] = None, reference = None):
+        """
+        Заполняет пропущенные годы (см. IndicatorPanel.fill_gaps).
+        :param panel: IndicatorPanel после удаления округов
+        :param impute: способ заполнения ("linear", "ffill", "ratio") или None - не заполнять
+        :param reference: индикатор-ориентир для "ratio" (FedStatIndicator с обработанными данными или IndicatorPanel)
+        :return: IndicatorPanel с заполненными пропусками
+        """
+        if not impute:
+            return panel
+        if isinstance(reference, FedStatIndicator):
+            if reference._panel is None:
+                raise ValueError(f"Данные индикатора-ориентира {reference.id} еще не обработаны")
+            reference = reference._panel
+        return panel.fill_gaps(impute, reference)
+
+    def _change_districts(self, panel, districts: Optional[dict] = None):
         
         """
         Группирует регионы по федеральным округам.
-        :param df: DataFrame после удаления округов
-        :return: DataFrame с добавленными строками по округам
-        """
-        districts_config = {
-            'Дальневосточный федеральный округ' : '|'.join([
-                r'Бурятия',
-                r'Забайкал',
-                r'Саха',
-                r'Якутия',
-                r'Камчат',
-                r'Приморск',
-                r'Хабаровский',
-                r'Амурская',
-                r'Магаданская',
-                r'Сахалинская',
-                r'Еврейская автономная область',
-                r'Чукотский автономный округ']),
-            'Сибирский федеральный округ' : '|'.join([
-                r'Алтай',
-                r'Тыва',
-                r'Хакасия',
-                r'Красноярский',
-                r'Иркутская',
-                r'Кемеровская',
-                r'Кузбасс',
-                r'Новосибирская',
-                r'Омская',
-                r'Томская']),
-            'Южный федеральный округ': '|'.join([
-                r'Адыгея', 
-                r'Калмыкия',
-                r'Краснодарский',
-                r'Астраханская',
-                r'Волгоградская',
-                r'Ростовская',
-                r'Крым',
-                r'Севастополь'
-                ]),
-            'Северо-Кавказский федеральный округ' :  '|'.join([
-                r'Дагестан',
-                r'Ингушетия',
-                r'Кабардин',
-                r'Балкар',
-                r'Карачаев',
-                r'Черкес',
-                r'Осетия',
-                r'Алания',
-                r'Чечен',
-                r'Ставрополь'
-            ])   
-        }
-        col_one = df.columns[0]
-        col_two = df.columns[1]
-        col_three = df.columns[2]
-        aggregated_dfs = []
-        for district_name, regions in districts_config.items():
-            mask = df.iloc[:, 0].str.contains(regions, case = False, na = False)
-            district_df = df[mask].copy()
-            if not district_df.empty:
-                agg_df = district_df.groupby(
-                    [col_two, col_three],
-                    as_index = False
-                ).sum(numeric_only = True)
-                agg_df.insert(0, col_one, district_name)
-                aggregated_dfs.append(agg_df)
-        df = pd.concat([df] + aggregated_dfs, ignore_index = True)
-        return df   
-
-    def _add_mid_year_values(self, df):
-        
-        if df is None:
-            df = self._change_districts()
-        
-        df['min_age']  = df.iloc[:, 1].apply(self._get_min_age)
-        df['max_age'] = df.iloc[:, 1].apply(self._get_max_age)
-        df['age_category'] = df.iloc[:, 1].apply(self._categorize_age)
+        Регион относится к округу по коду ОКАТО (если он известен из SDMX-ответа)
+        или по названию; все округа агрегируются за один проход по массиву значений.
+        :param panel: IndicatorPanel после удаления округов
+        :param districts: состав округов (по умолчанию DEFAULT_DISTRICTS)
+        :return: IndicatorPanel с добавленными рядами по округам
+        """
+        sums = self._district_sums(panel, districts)
+        if not len(sums[0]):
+            return panel
+        return IndicatorPanel.concat([panel, self._district_panel(panel.dims.columns, panel.years, sums, districts)])
 
-        
+    def _district_sums(self, panel, districts: Optional[dict] = None) -> tuple:
+        """
+        Суммирует ряды регионов по (округ, возраст, тип поселения).
+        :return: номера округов, метки возраста, метки типа поселения и суммы (группы x годы),
+                 упорядоченные по номеру округа и меткам
+        """
+        col_one, col_two, col_three = panel.dims.columns[:3]
+        index = DistrictIndex.get(districts)
+        okato = panel.attrs.get("dimension_codes", {}).get(col_one)
+        district = index.assign(panel.dims[col_one], okato)
 
-        min_year = min([int(col) for col in df.columns if col.isdigit()])
-        df_mid = pd.DataFrame()
+        ranks = []
+        for col in [col_two, col_three]:
+            categories = panel.dims[col].cat.categories.to_numpy(dtype = object)
+            rank = np.empty(len(categories) + 1, dtype = np.int64)
+            rank[np.argsort(categories, kind = "stable")] = np.arange(len(categories))
+            rank[-1] = -1
+            ranks.append((rank[panel.dims[col].cat.codes.to_numpy()], categories[np.argsort(categories, kind = "stable")]))
+        (age_rank, age_labels), (settlement_rank, settlement_labels) = ranks
 
-        for col in df.columns:
-            if col.isdigit():
-                if int(col) > min_year:
-                    df_mid[f"{col}mid"] = (df[f"{col}"] + df[f"{int(col)-1}"])/2
-                df_mid[f"{col}end"] = df[col]
-            else:
-                df_mid[col] = df[col]        
-        region_col = df.columns[0]
-        df_mid = df_mid.groupby(region_col, sort = False).apply(
-                lambda x: x.sort_values(['age_category', 'min_age', 'max_age'])
-                ).reset_index(drop = True)
-        return df_mid
-
-    def get_processed_data(self, data_type: str = "excel", filter_ids: List["str"] =  None ):
+        rows = np.flatnonzero((district >= 0) & (age_rank >= 0) & (settlement_rank >= 0))
+        return self._group_district_sums(
+            district[rows], age_rank[rows], age_labels, settlement_rank[rows], settlement_labels, panel.values[rows]
+        )
+
+    @staticmethod
+    def _group_district_sums(district, age_rank, age_labels, settlement_rank, settlement_labels, values) -> tuple:
+        """
+        Складывает строки values с одинаковыми (округ, ранг возраста, ранг типа поселения)
+        """
+        keys = (district * len(age_labels) + age_rank) * len(settlement_labels) + settlement_rank
+        groups, group_of_row = np.unique(keys, return_inverse = True)
+        sums = np.zeros((len(groups), values.shape[1]))
+        np.add.at(sums, group_of_row, np.nan_to_num(values))
+
+        settlement_of_group = groups % max(len(settlement_labels), 1)
+        age_of_group = groups // max(len(settlement_labels), 1) % max(len(age_labels), 1)
+        district_of_group = groups // max(len(settlement_labels), 1) // max(len(age_labels), 1)
+        return (
+            district_of_group,
+            np.asarray(age_labels, dtype = object)[age_of_group],
+            np.asarray(settlement_labels, dtype = object)[settlement_of_group],
+            sums
+        )
+
+    @classmethod
+    def _merge_district_sums(cls, parts: List[tuple]) -> tuple:
+        """
+        Объединяет суммы по округам, посчитанные по частям данных (см. _district_sums)
+        """
+        district, ages, settlements, values = (np.concatenate([part[i] for part in parts]) for i in range(4))
+        age_labels, age_rank = np.unique(ages, return_inverse = True)
+        settlement_labels, settlement_rank = np.unique(settlements, return_inverse = True)
+        return cls._group_district_sums(district, age_rank, age_labels, settlement_rank, settlement_labels, values)
+
+    @staticmethod
+    def _district_panel(columns, years, sums: tuple, districts: Optional[dict] = None) -> IndicatorPanel:
+        """
+        Строит ряды округов из сумм _district_sums
+        """
+        col_one, col_two, col_three = columns[:3]
+        index = DistrictIndex.get(districts)
+        district, ages, settlements, values = sums
+        dims = pd.DataFrame({
+            col_one: pd.Categorical(np.asarray(index.names, dtype = object)[district]),
+            col_two: pd.Categorical(ages),
+            col_three: pd.Categorical(settlements)
+        })
+        return IndicatorPanel(dims, years, values)
+
+    def _add_mid_year_values(self, panel, mid_year: bool = True):
+        """
+        Строит итоговую широкую таблицу со значениями на середину года.
+
+        Для каждого года Y столбец Y превращается в "Yend", а перед ним
+        добавляется "Ymid" - среднее между Y-1 и Y (если год Y-1 есть в данных).
+        Ряды упорядочиваются одним устойчивым lexsort по (порядок региона,
+        age_category, min_age, max_age).
+
+        :param panel: IndicatorPanel после агрегации по округам
+        :param mid_year: добавлять ли столбцы "Ymid" (иначе только "Yend")
+        :return: DataFrame со столбцами Yend/Ymid
+        """
+        min_age, max_age, age_category = self._age_lookup(panel.dims.iloc[:, 1])
+        region_codes = panel.dims.iloc[:, 0].cat.codes.to_numpy()
+        region_order, _ = pd.factorize(region_codes)
+        keys = [
+            np.nan_to_num(np.asarray(key, dtype = "float64"), nan = np.inf)
+            for key in [max_age, min_age, age_category]
+        ]
+        order = np.lexsort(keys + [region_order])
+        order = order[region_codes[order] >= 0]
+        return panel.take(order).to_frame(mid_year = mid_year)
+
+    def get_processed_data(self, data_type: str = "excel", filter_ids: List["str"] =  None,
+                           shard_by: Optional[str] = None, max_workers: int = 4,
+                           districts: Optional[dict] = None, impute: Optional[str] = None,
+                           reference = None, progress = None,
+                           observers: Optional[List[PipelineObserver]] = None, processes: int = 0):
         
         """
         Загружает, очищает и агрегирует данные Росстата для дальнейшего анализа.
@@ -286,22 +2325,920 @@ class FedStatIndicator:
         - Удаляет лишние строки и столбцы,
         - Приводит числовые столбцы к типу Int64.
         3. Удаляет из данных строки с федеральными округами (оставляет только регионы).
+        3a. При необходимости заполняет пропущенные годы (параметр impute).
         4. Агрегирует данные по федеральным округам:
         - Объединяет данные по регионам в укрупнённые федеральные округа.
         5. Добавляет дополнительные столбцы со значениями за середину года (среднее между двумя годами).
 
         :param data_type: Формат загружаемых данных с сайта (по умолчанию "excel").
         :param filter_ids: Список кодов фильтров для отбора данных (если не указан, загружаются все доступные).
+        :param shard_by: Код фильтра, по которому запрос делится на параллельно загружаемые части (см. `load_raw_indicator`).
+        :param max_workers: Число одновременно загружаемых частей.
+        :param districts: Состав пересчитываемых округов (по умолчанию DEFAULT_DISTRICTS, все восемь - FEDERAL_DISTRICTS).
+        :param impute: Способ заполнения пропущенных лет: "linear", "ffill", "ratio" (по умолчанию не заполняются).
+        :param reference: Индикатор-ориентир для impute = "ratio" (например, то же население другого пола).
+        :param progress: Функция progress(stage), вызываемая перед каждым шагом (см. PROCESSING_STAGES).
+        :param observers: Наблюдатели за шагами (PipelineObserver): время, строки, трафик, память, кэш.
+        :param processes: Число процессов, между которыми делятся регионы при обработке больших выгрузок (0 - без них).
         :return: pandas.DataFrame с итоговыми очищенными и агрегированными данными.
         """
 
-        raw_df = self.load_raw_indicator(
-            data_type = data_type,
-            filter_ids = filter_ids
-        )
-        df = self._preprocess_dataframe(raw_df)
-        df = self._remove_districts(df)
-        df = self._change_districts(df)
-        df = self._add_mid_year_values(df)
-        df = df.drop(columns = ['min_age', 'max_age', 'age_category'])
-        return df
\ No newline at end of file
+        run = PipelineRun(self, observers, progress)
+        with run.stage("load") as stage:
+            raw_df = self.load_raw_indicator(
+                data_type = data_type,
+                filter_ids = filter_ids,
+                shard_by = shard_by,
+                max_workers = max_workers
+            )
+            stage["rows_out"] = len(raw_df)
+        return self.process_raw(raw_df, districts, impute, reference, progress, observers, processes)
+
+    def process_raw(self, raw_df, districts: Optional[dict] = None, impute: Optional[str] = None,
+                    reference = None, progress = None,
+                    observers: Optional[List[PipelineObserver]] = None, processes: int = 0):
+        """
+        Выполняет шаги обработки 2-5 из `get_processed_data` над уже загруженной выгрузкой.
+        Не обращается к сети, поэтому может выполняться в отдельном процессе.
+
+        :param raw_df: DataFrame, полученный из load_raw_indicator
+        :param districts: Состав пересчитываемых округов
+        :param impute: Способ заполнения пропущенных лет
+        :param reference: Индикатор-ориентир для impute = "ratio"
+        :param progress: Функция progress(stage), вызываемая перед каждым шагом
+        :param observers: Наблюдатели за шагами (PipelineObserver)
+        :param processes: Число процессов для обработки по частям-регионам (0 - в текущем процессе;
+                          см. _process_partitioned)
+        :return: pandas.DataFrame с итоговыми данными
+        """
+        run = PipelineRun(self, observers, progress)
+        partitions = min(processes, len(raw_df) // PARTITION_MIN_ROWS) if impute != "ratio" else 0
+        if partitions > 1:
+            return self._process_partitioned(raw_df, districts, impute, partitions, run)
+        with run.stage("preprocess", len(raw_df)) as stage:
+            panel = self._preprocess_dataframe(raw_df)
+            stage["rows_out"] = len(panel)
+        if self._filter_ids is not None:
+            panel.attrs["filter_ids"] = list(self._filter_ids)
+        with run.stage("remove_districts", len(panel)) as stage:
+            panel = self._remove_districts(panel, districts)
+            stage["rows_out"] = len(panel)
+        if impute:
+            with run.stage("impute", len(panel)) as stage:
+                panel = self._impute_missing(panel, impute, reference)
+                stage["rows_out"] = len(panel)
+        with run.stage("change_districts", len(panel)) as stage:
+            panel = self._change_districts(panel, districts)
+            stage["rows_out"] = len(panel)
+        self._panel = panel
+        with run.stage("mid_year", len(panel)) as stage:
+            result = self._add_mid_year_values(panel)
+            stage["rows_out"] = len(result)
+        return result
+
+    def _process_partitioned(self, raw_df, districts: Optional[dict], impute: Optional[str],
+                             partitions: int, run: PipelineRun) -> pd.DataFrame:
+        """
+        Обрабатывает выгрузку по частям в partitions процессах.
+
+        Строки делятся по регионам (все строки региона - в одной части), части передаются
+        процессам через разделяемую память в формате Arrow IPC. Каждый процесс очищает
+        свою часть, удаляет округа, заполняет пропуски, строит итоговые строки своих
+        регионов и частичные суммы по округам. Здесь суммы объединяются в ряды округов,
+        а части склеиваются в порядке первого появления регионов - результат тот же,
+        что и при обработке в одном процессе. Процессы запускаются методом "spawn"
+        (как в load_indicators), поэтому обработку можно вызывать из многопоточных программ.
+        """
+        attrs = dict(raw_df.attrs)
+        if self._filter_ids is not None:
+            attrs["filter_ids"] = list(self._filter_ids)
+        dimensions = [col for col in raw_df.columns if not col.isdigit()]
+        years = sorted((int(col) for col in raw_df.columns if col.isdigit()))
+
+        segments, futures = [], []
+        with run.stage("partitions", len(raw_df)) as stage:
+            try:
+                with ProcessPoolExecutor(max_workers = partitions, mp_context = get_context("spawn")) as pool:
+                    for table in _partition_tables(raw_df, _region_partitions(raw_df, partitions)):
+                        segment, size = _to_shared_memory(table)
+                        segments.append(segment)
+                        futures.append(pool.submit(
+                            _process_partition, self.id, segment.name, size, attrs, districts, impute
+                        ))
+            finally:
+                for segment in segments:
+                    segment.close()
+                    segment.unlink()
+                outputs = [future.result() for future in futures if future.exception() is None]
+                for output in outputs:
+                    output["frame"] = _read_shared_frame(output["segment"], output["size"])
+            for future in futures:
+                if future.exception() is not None:
+                    raise future.exception()
+            stage["rows_out"] = sum(output["rows"] for output in outputs)
+
+        with run.stage("change_districts", stage["rows_out"]) as stage:
+            sums = self._merge_district_sums([output["sums"] for output in outputs])
+            aggregated = self._district_panel(dimensions, years, sums, districts) if len(sums[0]) else None
+            stage["rows_out"] = len(sums[0])
+
+        with run.stage("mid_year") as stage:
+            firsts = [output["first"] for output in outputs if output["first"]]
+            frames = [output["frame"] for output in outputs if len(output["frame"])] or [outputs[0]["frame"]]
+            result = pd.concat(frames, ignore_index = True)
+            if any(min(later.values()) < max(earlier.values()) for earlier, later in zip(firsts, firsts[1:])):
+                first = {label: position for part in firsts for label, position in part.items()}
+                order = np.argsort(result.iloc[:, 0].map(first).to_numpy(), kind = "stable")
+                result = result.take(order).reset_index(drop = True)
+            if aggregated is not None:
+                result = pd.concat([result, self._add_mid_year_values(aggregated)], ignore_index = True)
+            stage["rows_out"] = len(result)
+        self._panel = IndicatorPanel.from_output(result)
+        self._panel.attrs = attrs
+        return result
+
+
+class IndicatorQuery:
+    """
+    Ленивый запрос к индикатору.
+
+    Запоминает нужные регионы, годы, возрасты и типы поселения и ничего не загружает
+    до вызова collect(). Перед загрузкой условия переводятся в минимальный набор
+    selectedFilterIds - только нужные значения фильтров, - а шаги обработки,
+    результат которых не запрошен (пересчет округов, значения на середину года),
+    пропускаются. Пример:
+
+        indicator.query(regions = ["г. Москва"], years = range(2021, 2026)).collect()
+    """
+
+    _CONDITIONS = ("regions", "years", "ages", "settlements", "filters", "mid_year", "districts")
+
+    def __init__(self, indicator: FedStatIndicator, regions = None, years = None, ages = None,
+                 settlements = None, filters: Optional[dict] = None, mid_year: bool = True,
+                 districts = None):
+        """
+        :param indicator: FedStatIndicator
+        :param regions: названия регионов и/или пересчитываемых округов; None - все
+        :param years: годы; None - все
+        :param ages: возрасты ("0", "0 лет", "5-9", ...); None - все
+        :param settlements: типы поселения; None - все
+        :param filters: условия по прочим фильтрам {код фильтра: [названия значений]}
+        :param mid_year: нужны ли столбцы "Ymid"
+        :param districts: состав пересчитываемых округов (по умолчанию DEFAULT_DISTRICTS), False - не пересчитывать
+        """
+        self.indicator = indicator
+        self.regions = self._as_list(regions)
+        self.years = self._as_list(years)
+        self.ages = self._as_list(ages)
+        self.settlements = self._as_list(settlements)
+        self.filters = {key: self._as_list(values) for key, values in (filters or {}).items()}
+        self.mid_year = mid_year
+        self.districts = districts
+
+    @staticmethod
+    def _as_list(values):
+        if values is None:
+            return None
+        if isinstance(values, (str, int, np.integer)):
+            return [values]
+        return list(values)
+
+    def where(self, **conditions) -> "IndicatorQuery":
+        """
+        Возвращает новый запрос с измененными условиями
+        """
+        unknown = set(conditions) - set(self._CONDITIONS)
+        if unknown:
+            raise ValueError(f"Неизвестные условия запроса: {sorted(unknown)}")
+        current = {name: getattr(self, name) for name in self._CONDITIONS}
+        current.update(conditions)
+        return IndicatorQuery(self.indicator, **current)
+
+    @staticmethod
+    def _normalize_age(label) -> str:
+        return re.sub(r'\s*(лет|года|год)$', '', str(label)).strip()
+
+    @staticmethod
+    def _match(code: str, values: dict, wanted: list, normalize = lambda label: str(label).strip()) -> List[str]:
+        """
+        Возвращает коды значений фильтра code, соответствующие названиям (или кодам) из wanted
+        """
+        by_title = {}
+        for filter_id, title in values.items():
+            by_title.setdefault(normalize(title), filter_id)
+        matched = []
+        for label in wanted:
+            filter_id = label if label in values else by_title.get(normalize(label))
+            if filter_id is None:
+                raise ValueError(f"Значение '{label}' не найдено в фильтре {code}")
+            matched.append(filter_id)
+        return list(dict.fromkeys(matched))
+
+    def plan(self) -> dict:
+        """
+        Переводит условия в параметры запроса к data.do и список нужных шагов обработки.
+        Использует только метаданные индикатора (фильтры), данные не загружаются.
+
+        :return: словарь с ключами filter_ids, lineObjectIds, columnObjectIds,
+                 stages (шаги обработки), regions и years (что оставить в результате, None - все)
+        """
+        indicator = self.indicator
+        categories = indicator.filter_categories
+        index = DistrictIndex.get(self.districts) if self.districts is not False else None
+        conditions = dict(self.filters)
+        selected = {code: list(values) for code, values in categories.items()}
+        stages = ["preprocess"]
+        keep_regions, keep_years = None, None
+
+        if self.regions is not None and REGION_FILTER in categories:
+            values = categories[REGION_FILTER]
+            plain, recompute = [], set()
+            for label in self.regions:
+                district = index.district_of(label) if index is not None and label not in values else -1
+                if district >= 0:
+                    recompute.add(district)
+                else:
+                    plain.append(label)
+            region_ids = self._match(REGION_FILTER, values, plain)
+            keep_regions = [str(values[filter_id]).strip() for filter_id in region_ids]
+            if recompute:
+                titles = pd.Series(list(values.values()))
+                members = np.isin(index.assign(titles), list(recompute)) & ~index.district_rows(titles)
+                region_ids += [filter_id for filter_id, member in zip(values, members) if member]
+                keep_regions += [index.names[district] for district in sorted(recompute)]
+                stages.append("change_districts")
+            selected[REGION_FILTER] = list(dict.fromkeys(region_ids))
+        elif index is not None:
+            stages += ["remove_districts", "change_districts"]
+
+        if self.years is not None and YEAR_FILTER in categories:
+            available = indicator.available_years()
+            keep_years = [int(year) for year in self.years]
+            missing = [year for year in keep_years if year not in available]
+            if missing:
+                raise ValueError(f"Годы {missing} отсутствуют в данных индикатора {indicator.id}")
+            fetch_years = set(keep_years)
+            if self.mid_year:
+                fetch_years |= {year - 1 for year in keep_years if year - 1 in available}
+            selected[YEAR_FILTER] = [available[year] for year in sorted(fetch_years)]
+
+        if self.ages is not None:
+            conditions[AGE_FILTER] = self.ages
+        if self.settlements is not None:
+            conditions[SETTLEMENT_FILTER] = self.settlements
+        for code, wanted in conditions.items():
+            if code not in categories:
+                raise ValueError(f"У индикатора {indicator.id} нет фильтра {code}")
+            normalize = self._normalize_age if code == AGE_FILTER else (lambda label: str(label).strip())
+            selected[code] = self._match(code, categories[code], wanted, normalize)
+
+        if self.mid_year:
+            stages.append("mid_year")
+        lineObjectIds, columnObjectIds = indicator._request_layout()
+        return {
+            "filter_ids": [filter_id for values in selected.values() for filter_id in values],
+            "lineObjectIds": lineObjectIds,
+            "columnObjectIds": columnObjectIds,
+            "stages": stages,
+            "regions": keep_regions,
+            "years": keep_years,
+        }
+
+    def collect(self, data_type: str = "excel") -> pd.DataFrame:
+        """
+        Загружает только нужные значения фильтров и выполняет только нужные шаги обработки
+
+        :param data_type: Формат загружаемых данных
+        :return: pandas.DataFrame в том же виде, что и get_processed_data
+        """
+        plan = self.plan()
+        indicator = self.indicator
+        districts = self.districts or None
+        saved = indicator._raw_data, indicator._filter_ids
+        indicator._raw_data = None
+        try:
+            raw_df = indicator.load_raw_indicator(data_type = data_type, filter_ids = plan["filter_ids"])
+        finally:
+            indicator._raw_data, indicator._filter_ids = saved
+
+        panel = indicator._preprocess_dataframe(raw_df)
+        if "remove_districts" in plan["stages"]:
+            panel = indicator._remove_districts(panel, districts)
+        if "change_districts" in plan["stages"]:
+            panel = indicator._change_districts(panel, districts)
+        if plan["regions"] is not None:
+            panel = panel.take(panel.dims.iloc[:, 0].isin(plan["regions"]).to_numpy())
+        result = indicator._add_mid_year_values(panel, mid_year = "mid_year" in plan["stages"])
+        if plan["years"] is not None:
+            extra = [
+                col for col in result.columns
+                if _VALUE_COLUMN.match(str(col)) and int(str(col)[:4]) not in plan["years"]
+            ]
+            result = result.drop(columns = extra)
+        return result
+
+
+# Минимальное число строк выгрузки на один процесс при обработке по частям
+PARTITION_MIN_ROWS = 50_000
+
+_ROW_COLUMN = "__row__"
+
+
+def _region_partitions(raw_df: pd.DataFrame, partitions: int) -> List[np.ndarray]:
+    """
+    Делит строки выгрузки на части примерно равного размера так, что все строки
+    одного региона (с точностью до пробелов в названии) попадают в одну часть,
+    а регионы идут по частям в порядке первого появления
+
+    :return: номера строк каждой части (по возрастанию)
+    """
+    codes, labels = pd.factorize(raw_df.iloc[:, 0])
+    stripped, _ = pd.factorize(pd.Index(
+        [label.strip() if isinstance(label, str) else None for label in labels], dtype = object
+    ))
+    region = np.append(stripped, -1)[codes]
+    regions, first, counts = np.unique(region, return_index = True, return_counts = True)
+    order = np.argsort(first, kind = "stable")
+    rows_before = np.cumsum(counts[order]) - counts[order]
+    part_of_region = np.empty(len(regions), dtype = np.int64)
+    part_of_region[order] = rows_before * partitions // max(len(raw_df), 1)
+    part = part_of_region[np.searchsorted(regions, region)]
+    return [np.flatnonzero(part == i) for i in np.unique(part)]
+
+
+def _partition_tables(raw_df: pd.DataFrame, parts: List[np.ndarray]):
+    """
+    Переводит части выгрузки в таблицы Arrow: измерения - словарные столбцы с общим
+    для всех частей словарем (метки не-строки становятся пропусками, как и при очистке),
+    годы - float64, плюс номера строк исходной выгрузки
+
+    :return: генератор таблиц, по одной на часть
+    """
+    import pyarrow as pa
+
+    encoded = {}
+    for col in raw_df.columns:
+        if col.isdigit():
+            continue
+        codes, labels = pd.factorize(raw_df[col].to_numpy(dtype = object))
+        valid = np.array([isinstance(label, str) for label in labels], dtype = bool)
+        remap = np.full(len(labels) + 1, -1, dtype = np.int32)
+        remap[np.flatnonzero(valid)] = np.arange(valid.sum())
+        encoded[col] = (remap[codes], pa.array(labels[valid].tolist(), type = pa.string()))
+    years = [col for col in raw_df.columns if col.isdigit()]
+    values = raw_df[years].to_numpy(dtype = "float64", na_value = np.nan)
+
+    for rows in parts:
+        part_values = np.ascontiguousarray(values[rows].T)
+        columns = {}
+        for col in raw_df.columns:
+            if col in encoded:
+                codes, dictionary = encoded[col]
+                codes = codes[rows]
+                columns[col] = pa.DictionaryArray.from_arrays(pa.array(codes, mask = codes < 0), dictionary)
+            else:
+                columns[col] = pa.array(part_values[years.index(col)])
+        columns[_ROW_COLUMN] = pa.array(rows, type = pa.int64())
+        yield pa.table(columns)
+
+
+def _to_shared_memory(table):
+    """
+    Записывает таблицу Arrow в новый блок разделяемой памяти (Arrow IPC)
+
+    :return: (SharedMemory, размер данных в байтах)
+    """
+    import pyarrow as pa
+    from multiprocessing.shared_memory import SharedMemory
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    buffer = sink.getvalue()
+    segment = SharedMemory(create = True, size = max(buffer.size, 1))
+    try:
+        segment.buf[:buffer.size] = memoryview(buffer).cast("B")
+    except Exception:
+        segment.close()
+        segment.unlink()
+        raise
+    return segment, buffer.size
+
+
+def _read_shared_table(name: str, size: int, to_pandas = None) -> pd.DataFrame:
+    """
+    Читает таблицу Arrow прямо из блока разделяемой памяти (без копии байтов блока),
+    переводит ее в pandas и закрывает блок
+
+    :param to_pandas: функция to_pandas(table) -> DataFrame; по умолчанию table.to_pandas()
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    segment = SharedMemory(name = name)
+    # При ошибке буферы Arrow из трассировки еще ссылаются на блок - он закроется при сборке мусора
+    frame = _shared_table_to_pandas(segment.buf, size, to_pandas or (lambda table: table.to_pandas()))
+    segment.close()
+    return frame
+
+
+def _shared_table_to_pandas(buf, size: int, to_pandas) -> pd.DataFrame:
+    """
+    Переводит Arrow IPC из буфера разделяемой памяти в pandas; ссылки на буфер
+    живут только внутри функции, поэтому после возврата блок можно закрыть
+    """
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(pa.py_buffer(buf).slice(0, size)).read_all()
+    return to_pandas(table)
+
+
+def _read_shared_frame(name: str, size: int) -> pd.DataFrame:
+    """
+    Читает итоговую таблицу части из разделяемой памяти и удаляет блок
+    """
+    import pyarrow as pa
+    from multiprocessing.shared_memory import SharedMemory
+
+    # Столбцы Int64/Float64 создаются поверх буферов Arrow без копии,
+    # поэтому копируются в память процесса, пока блок еще открыт
+    types = {pa.int64(): pd.Int64Dtype(), pa.float64(): pd.Float64Dtype()}
+    try:
+        frame = _read_shared_table(name, size, lambda table: table.to_pandas(types_mapper = types.get).copy())
+    finally:
+        segment = SharedMemory(name = name)
+        segment.close()
+        segment.unlink()
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            labels = np.append(frame[col].cat.categories.to_numpy(dtype = object), np.nan)
+            frame[col] = labels[frame[col].cat.codes.to_numpy()]
+    return frame
+
+
+def _process_partition(indicator_id, name: str, size: int, attrs: dict,
+                       districts: Optional[dict] = None, impute: Optional[str] = None) -> dict:
+    """
+    Обрабатывает часть выгрузки (выполняется в процессе-обработчике, см. FedStatIndicator._process_partitioned)
+
+    :return: словарь с блоком разделяемой памяти итоговых строк (segment, size), числом рядов,
+             номером первой строки каждого региона в исходной выгрузке и частичными суммами по округам
+    """
+    import pyarrow as pa
+
+    df = _read_shared_table(name, size)
+    rows = df.pop(_ROW_COLUMN).to_numpy()
+    df.attrs = attrs
+    indicator = FedStatIndicator(indicator_id, cache = False, metadata_store = False)
+    panel, kept = indicator._preprocess_dataframe(df, return_rows = True)
+    del df
+    rows = rows[kept]
+    keep = ~DistrictIndex.get(districts).district_rows(panel.dims.iloc[:, 0])
+    panel, rows = panel.take(keep), rows[keep]
+    if impute:
+        panel = panel.fill_gaps(impute)
+
+    region_codes = panel.dims.iloc[:, 0].cat.codes.to_numpy()
+    codes, first = np.unique(region_codes, return_index = True)
+    labels = panel.dims.iloc[:, 0].cat.categories
+    frame = indicator._add_mid_year_values(panel)
+    for col in panel.dims.columns:
+        frame[col] = frame[col].astype("category")
+    segment, frame_size = _to_shared_memory(pa.Table.from_pandas(frame, preserve_index = False))
+    segment.close()
+    return {
+        "segment": segment.name,
+        "size": frame_size,
+        "rows": len(panel),
+        "first": {labels[code]: int(rows[i]) for code, i in zip(codes, first) if code >= 0},
+        "sums": indicator._district_sums(panel, districts),
+    }
+
+
+def _process_raw_indicator(indicator_id, raw_df, districts: Optional[dict] = None, collect: bool = False,
+                           postprocess = None, observers: Optional[List[PipelineObserver]] = None):
+    """
+    Обрабатывает выгрузку индикатора (выполняется в процессе-обработчике).
+    При collect = True возвращает также замеры шагов, чтобы передать их наблюдателям в основном процессе;
+    observers получают шаги сразу (при обработке в текущем процессе).
+    """
+    indicator = FedStatIndicator(indicator_id, cache = False, metadata_store = False)
+    observers = list(observers or []) + ([MetricsCollector()] if collect else [])
+    result = indicator.process_raw(raw_df, districts, observers = observers)
+    if postprocess is not None:
+        with PipelineRun(indicator, observers).stage("postprocess", rows_in = len(result)):
+            result = postprocess(indicator_id, result)
+    if not collect:
+        return result
+    return result, observers[-1].events
+
+
+def load_indicators(indicator_ids: List, filter_ids = None, data_type: str = "excel",
+                    max_workers: int = 4, processes: Optional[int] = 0,
+                    districts: Optional[dict] = None, progress = None,
+                    observers: Optional[List[PipelineObserver]] = None, postprocess = None) -> dict:
+    """
+    Загружает и обрабатывает несколько индикаторов параллельно.
+
+    Метаданные и данные индикаторов загружаются одновременно в пуле потоков,
+    обработка каждой выгрузки запускается в пуле процессов сразу после ее загрузки.
+    Ошибка одного индикатора не прерывает загрузку остальных.
+
+    :param indicator_ids: список кодов индикаторов
+    :param filter_ids: общий список кодов фильтров или словарь {код индикатора: список};
+                       None - все доступные значения
+    :param data_type: формат загружаемых данных
+    :param max_workers: число одновременных загрузок
+    :param processes: число процессов обработки (по умолчанию 0 - обработка в текущем процессе;
+                      None - по числу индикаторов, но не больше числа ядер). Процессы
+                      запускаются методом "spawn", а не "fork", поэтому функцию можно вызывать
+                      из многопоточных программ (например, из фонового потока Streamlit);
+                      запускающий скрипт должен вызывать ее под if __name__ == "__main__"
+    :param districts: состав пересчитываемых округов
+    :param progress: функция progress(indicator_id, stage), вызываемая при переходе
+                     индикатора к загрузке ("load"), обработке ("process") и по готовности ("done")
+    :param observers: наблюдатели за шагами (PipelineObserver); при обработке в текущем процессе
+                      шаги передаются им сразу, замеры шагов обработки в других процессах -
+                      после завершения обработки индикатора
+    :param postprocess: функция postprocess(indicator_id, df), вызываемая в процессе обработки
+                        сразу после нее (например, запись результата в файл); ее результат
+                        возвращается вместо DataFrame. При processes > 0 должна сериализоваться pickle
+    :return: словарь {код индикатора: DataFrame (или результат postprocess) или исключение,
+             возникшее при его загрузке}
+    """
+    report = progress or (lambda indicator_id, stage: None)
+
+    def selection(indicator_id):
+        if isinstance(filter_ids, dict):
+            return filter_ids.get(indicator_id)
+        return filter_ids
+
+    def fetch(indicator_id):
+        report(indicator_id, "load")
+        indicator = FedStatIndicator(indicator_id)
+        with PipelineRun(indicator, observers).stage("load") as stage:
+            raw_df = indicator.load_raw_indicator(data_type = data_type, filter_ids = selection(indicator_id))
+            stage["rows_out"] = len(raw_df)
+        return raw_df
+
+    def replay(events):
+        for event in events:
+            for observer in observers:
+                observer.stage_started(event)
+                observer.stage_finished(event)
+
+    collect = bool(observers)
+
+    if processes is None:
+        processes = min(len(indicator_ids), os.cpu_count() or 1)
+
+    results = {}
+    pending = {}
+    process_pool = ProcessPoolExecutor(
+        max_workers = processes, mp_context = get_context("spawn")
+    ) if processes > 0 else None
+    try:
+        with ThreadPoolExecutor(max_workers = max_workers) as executor:
+            fetches = {executor.submit(fetch, indicator_id): indicator_id for indicator_id in indicator_ids}
+            for future in as_completed(fetches):
+                indicator_id = fetches[future]
+                try:
+                    raw_df = future.result()
+                    report(indicator_id, "process")
+                    if process_pool is None:
+                        results[indicator_id] = _process_raw_indicator(
+                            indicator_id, raw_df, districts, postprocess = postprocess, observers = observers
+                        )
+                        report(indicator_id, "done")
+                    else:
+                        pending[process_pool.submit(
+                            _process_raw_indicator, indicator_id, raw_df, districts, collect, postprocess
+                        )] = indicator_id
+                except Exception as e:
+                    results[indicator_id] = e
+                    report(indicator_id, "done")
+        for future in as_completed(pending):
+            indicator_id = pending[future]
+            try:
+                result = future.result()
+                if collect:
+                    result, events = result
+                    replay(events)
+                results[indicator_id] = result
+            except Exception as e:
+                results[indicator_id] = e
+            report(indicator_id, "done")
+    finally:
+        if process_pool is not None:
+            process_pool.shutdown()
+    return {indicator_id: results[indicator_id] for indicator_id in indicator_ids}
+
+
+def _merge_order(sequences) -> list:
+    """
+    Объединяет последовательности ключей с сохранением порядка каждой из них:
+    новый ключ ставится сразу после предшествующего ему ключа своей последовательности
+    """
+    start = object()
+    following = {start: None}
+    for keys in sequences:
+        previous = start
+        for key in keys:
+            if key not in following:
+                following[key] = following[previous]
+                following[previous] = key
+            previous = key
+    order = []
+    key = following[start]
+    while key is not None:
+        order.append(key)
+        key = following[key]
+    return order
+
+
+_VALUE_COLUMN = re.compile(r"^\d{4}(end|mid)?$")
+
+
+def _value_columns(df: pd.DataFrame) -> List[str]:
+    """
+    Возвращает столбцы со значениями по годам ("Y", "Yend", "Ymid")
+    """
+    return [col for col in df.columns if _VALUE_COLUMN.match(str(col))]
+
+
+def align_indicators(*frames: pd.DataFrame) -> List[pd.DataFrame]:
+    """
+    Выравнивает обработанные индикаторы по ключу измерений (регион, возраст, тип поселения).
+
+    Ключ - все столбцы, кроме значений по годам; он берется по позиции
+    и получает названия из первой таблицы. Таблицы соединяются через
+    MultiIndex: остаются только ключи, присутствующие во всех таблицах,
+    в порядке первой таблицы.
+
+    :param frames: результаты get_processed_data
+    :return: список таблиц с одинаковым набором и порядком строк
+    """
+    keys = [col for col in frames[0].columns if col not in _value_columns(frames[0])]
+    indexed = []
+    for frame in frames:
+        frame_keys = [col for col in frame.columns if col not in _value_columns(frame)]
+        if len(frame_keys) != len(keys):
+            raise ValueError("Индикаторы имеют разный набор измерений")
+        frame = frame.rename(columns = dict(zip(frame_keys, keys))).set_index(keys)
+        if not frame.index.is_unique:
+            raise ValueError(
+                "Ключ измерений не уникален. "
+                "Возможно, в данных есть дубликаты ключевых колонок."
+            )
+        indexed.append(frame)
+
+    common = indexed[0].index
+    for frame in indexed[1:]:
+        common = common.intersection(frame.index, sort = False)
+    return [frame.reindex(common).reset_index() for frame in indexed]
+
+
+def combine_sum(*frames: pd.DataFrame) -> pd.DataFrame:
+    """
+    Складывает значения нескольких индикаторов по совпадающим ключам измерений
+    (например, мужчины + женщины = все население)
+
+    :param frames: результаты get_processed_data
+    :return: DataFrame с суммами по общим столбцам лет
+    """
+    aligned = align_indicators(*frames)
+    value_cols = [col for col in _value_columns(aligned[0]) if all(col in frame for frame in aligned[1:])]
+    result = aligned[0].copy()
+    total = aligned[0][value_cols]
+    for frame in aligned[1:]:
+        total = total + frame[value_cols]
+    result[value_cols] = total
+    return result
+
+
+def combine_ratio(numerator: pd.DataFrame, denominator: pd.DataFrame) -> pd.DataFrame:
+    """
+    Делит значения одного индикатора на значения другого по совпадающим ключам измерений;
+    деление на ноль дает пропуск
+
+    :param numerator: делимое (результат get_processed_data)
+    :param denominator: делитель (результат get_processed_data)
+    :return: DataFrame с отношениями по общим столбцам лет
+    """
+    numerator, denominator = align_indicators(numerator, denominator)
+    value_cols = [col for col in _value_columns(numerator) if col in denominator]
+    result = numerator.copy()
+    divisor = denominator[value_cols].astype("Float64")
+    result[value_cols] = numerator[value_cols].astype("Float64") / divisor.where(divisor != 0)
+    return result
+
+
+def fill_missing_years(target: pd.DataFrame, reference: pd.DataFrame) -> pd.DataFrame:
+    """
+    Заполняет пропущенные годы одного индикатора по другому.
+
+    Для каждой строки считается отношение target / reference по годам,
+    пропуски отношения линейно интерполируются между соседними известными годами,
+    после чего пропуск target заменяется на reference * отношение.
+    Столбцы "Ymid", зависящие от заполненных лет, пересчитываются.
+
+    :param target: индикатор с пропусками (результат get_processed_data)
+    :param reference: индикатор, по которому заполняются пропуски
+    :return: target, выровненный по reference, с заполненными пропусками
+    """
+    target, reference = align_indicators(target, reference)
+    end_cols = [col for col in _value_columns(target) if str(col).endswith("end") and col in reference]
+    if not end_cols:
+        return target
+    years = np.array([int(col[:4]) for col in end_cols])
+
+    target_values = target[end_cols].to_numpy(dtype = "float64", na_value = np.nan)
+    reference_values = reference[end_cols].to_numpy(dtype = "float64", na_value = np.nan)
+    filled = _fill_by_ratio(target_values, reference_values, years)
+    fill = np.isnan(target_values) & ~np.isnan(filled)
+    if not fill.any():
+        return target
+    target_values = filled
+
+    result = target.copy()
+    filled_years = set(years[fill.any(axis = 0)].tolist())
+    position = {year: i for i, year in enumerate(years)}
+    for i in np.flatnonzero(fill.any(axis = 0)):
+        column = target_values[:, i]
+        result[end_cols[i]] = pd.arrays.FloatingArray(column, np.isnan(column))
+    for year in sorted(filled_years | {year + 1 for year in filled_years}):
+        mid_col = f"{year}mid"
+        if mid_col in result and year in position and year - 1 in position:
+            mid = (target_values[:, position[year]] + target_values[:, position[year - 1]]) / 2
+            result[mid_col] = pd.arrays.FloatingArray(mid, np.isnan(mid))
+    return result
+
+EXPORT_FORMATS = {
+    "xlsx": {"label": "Excel", "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "csv": {"label": "CSV", "mime": "text/csv"},
+    "parquet": {"label": "Parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Возвращает отпечаток таблицы (sha256 от значений, названий и типов столбцов)
+    """
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index = False).to_numpy().tobytes())
+    digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()], ensure_ascii = False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class _ChunkSink:
+    """
+    Файлоподобный приемник: накапливает записанные байты до очередного drain()
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def iter_export(df: pd.DataFrame, export_format: str, chunk_rows: int = 50_000,
+                encoding: str = "windows-1251"):
+    """
+    Сериализует таблицу в выбранный формат, порциями по chunk_rows строк.
+
+    :param df: таблица (например, результат get_processed_data)
+    :param export_format: "xlsx", "csv" или "parquet"
+    :param chunk_rows: число строк в одной порции
+    :param encoding: кодировка CSV (символы вне кодировки заменяются на "?")
+    :return: генератор байтовых фрагментов файла
+    """
+    chunks = (df.iloc[start:start + chunk_rows] for start in range(0, max(len(df), 1), chunk_rows))
+    if export_format == "csv":
+        for i, chunk in enumerate(chunks):
+            yield chunk.to_csv(index = False, header = (i == 0)).encode(encoding, errors = "replace")
+    elif export_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        sink = _ChunkSink()
+        schema = pa.Schema.from_pandas(df, preserve_index = False)
+        with pq.ParquetWriter(sink, schema) as writer:
+            for chunk in chunks:
+                writer.write_table(pa.Table.from_pandas(chunk, schema = schema, preserve_index = False))
+                yield sink.drain()
+        yield sink.drain()
+    elif export_format == "xlsx":
+        from openpyxl import Workbook
+        workbook = Workbook(write_only = True)
+        sheet = workbook.create_sheet("Sheet1")
+        sheet.append([str(col) for col in df.columns])
+        for chunk in chunks:
+            rows = chunk.astype(object).where(chunk.notna(), None)
+            for row in rows.itertuples(index = False, name = None):
+                sheet.append(row)
+        sink = _ChunkSink()
+        workbook.save(sink)
+        yield sink.drain()
+    else:
+        raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+
+
+class ExportCache:
+    """
+    Кэш готовых файлов выгрузки в памяти: ключ - отпечаток таблицы и формат.
+    При превышении max_bytes вытесняются давно не запрашивавшиеся файлы.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2):
+        """
+        :param max_bytes: предельный суммарный размер файлов в байтах
+        """
+        self.max_bytes = max_bytes
+        self._items = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.pop(key, None)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items[key] = data
+            self.hits += 1
+            return data
+
+    def put(self, key, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                evicted = self._items.pop(next(iter(self._items)))
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+_default_export_cache = None
+
+def get_default_export_cache() -> ExportCache:
+    """
+    Возвращает общий для процесса кэш выгрузок
+    """
+    global _default_export_cache
+    if _default_export_cache is None:
+        _default_export_cache = ExportCache()
+    return _default_export_cache
+
+
+def export_dataframe(df: pd.DataFrame, export_format: str, cache: Optional[ExportCache] = None,
+                     chunk_rows: int = 50_000, encoding: str = "windows-1251") -> bytes:
+    """
+    Возвращает файл выгрузки в выбранном формате.
+    Файл строится только при первом запросе для данной таблицы и формата,
+    повторные запросы берут его из кэша.
+
+    :param df: таблица (например, результат get_processed_data)
+    :param export_format: "xlsx", "csv" или "parquet"
+    :param cache: кэш выгрузок; по умолчанию общий для процесса, False - без кэша
+    :param chunk_rows: число строк в одной порции при сериализации
+    :param encoding: кодировка CSV
+    :return: содержимое файла
+    """
+    cache = get_default_export_cache() if cache is None else cache
+    key = (dataset_fingerprint(df), export_format, encoding if export_format == "csv" else None)
+    if cache:
+        data = cache.get(key)
+        if data is not None:
+            return data
+    data = b"".join(iter_export(df, export_format, chunk_rows, encoding))
+    if cache:
+        cache.put(key, data)
+    return data
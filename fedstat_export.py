@@ -0,0 +1,267 @@
+"""
+Пакетная выгрузка индикаторов fedstat.ru без интерфейса (например, для ночных заданий).
+
+Манифест - JSON-файл со списком индикаторов и нужных значений фильтров:
+
+    {
+        "format": "xlsx",
+        "items": [
+            {"id": 31548, "name": "men"},
+            {"id": 33459, "name": "women_2020", "format": "csv",
+             "filters": {"Год": ["2019", "2020"], "Возраст": ["Всего"]}},
+            {"id": 33459, "filter_ids": ["3_2020", "57831_1792"]}
+        ]
+    }
+
+    id          - код индикатора
+    name        - имя файла результата без расширения (по умолчанию код индикатора)
+    format      - "xlsx", "csv" или "parquet" (по умолчанию --format или "format" манифеста)
+    filters     - {код или название фильтра: [названия или коды значений]}; не указанные
+                  фильтры выгружаются целиком
+    filter_ids  - готовый список selectedFilterIds (вместо filters)
+
+Индикаторы загружаются одновременно не более чем в --connections соединениях,
+обработка и запись файлов идут в --processes процессах. Каждый файл записывается
+атомарно, поэтому после прерывания повторный запуск пропускает готовые файлы
+(--force - выгрузить заново). В конце печатается время шагов по индикаторам.
+
+Запуск:
+    python fedstat_export.py manifest.json --output-dir exports
+    python fedstat_export.py manifest.json --output-dir exports --format parquet --processes 4
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import fedstat_api as fa
+
+
+def read_manifest(path: str, default_format: Optional[str] = None) -> List[dict]:
+    """
+    Читает манифест и приводит элементы к виду {id, name, format, filters, filter_ids}
+
+    :param path: путь к JSON-файлу
+    :param default_format: формат для элементов без "format" (важнее "format" манифеста)
+    :return: список элементов
+    """
+    with open(path, encoding = "utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"items": manifest}
+    default_format = default_format or manifest.get("format", "xlsx")
+
+    items, names = [], set()
+    for entry in manifest.get("items", []):
+        if not isinstance(entry, dict):
+            entry = {"id": entry}
+        if "id" not in entry:
+            raise ValueError(f"В элементе манифеста нет кода индикатора: {entry}")
+        if "filters" in entry and "filter_ids" in entry:
+            raise ValueError(f"Для индикатора {entry['id']} заданы одновременно filters и filter_ids")
+        item = {
+            "id": entry["id"],
+            "name": str(entry.get("name", entry["id"])),
+            "format": entry.get("format", default_format),
+            "filters": entry.get("filters"),
+            "filter_ids": entry.get("filter_ids"),
+        }
+        if item["format"] not in fa.EXPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат выгрузки: {item['format']}")
+        if item["name"] in names:
+            raise ValueError(f"Имя '{item['name']}' встречается в манифесте несколько раз")
+        names.add(item["name"])
+        items.append(item)
+    return items
+
+
+def output_path(output_dir: str, item: dict) -> str:
+    return os.path.join(output_dir, f"{item['name']}.{item['format']}")
+
+
+def resolve_filter_ids(item: dict) -> Optional[List[str]]:
+    """
+    Переводит условия filters элемента манифеста в selectedFilterIds.
+    Фильтры можно указывать кодом или названием, значения - названием или кодом.
+    """
+    if item["filters"] is None:
+        return item["filter_ids"]
+    indicator = fa.FedStatIndicator(item["id"])
+    by_title = {title: code for code, title in indicator.filter_codes.items()}
+    conditions = {}
+    for key, values in item["filters"].items():
+        code = key if key in indicator.filter_codes else by_title.get(key)
+        if code is None:
+            raise ValueError(f"У индикатора {item['id']} нет фильтра '{key}'")
+        conditions[code] = values
+    return indicator.query(filters = conditions).plan()["filter_ids"]
+
+
+class ExportWriter:
+    """
+    Записывает результат обработки в файл (выполняется в процессе-обработчике)
+    """
+
+    def __init__(self, targets: dict):
+        """
+        :param targets: {код индикатора: (путь к файлу, формат)}
+        """
+        self.targets = targets
+
+    def __call__(self, indicator_id, df) -> dict:
+        path, export_format = self.targets[indicator_id]
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in fa.iter_export(df, export_format):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return {"path": path, "rows": len(df)}
+
+
+def _batches(items: List[dict]) -> List[List[dict]]:
+    """
+    Делит элементы на пакеты без повторяющихся индикаторов
+    (load_indicators возвращает результаты по коду индикатора)
+    """
+    batches = []
+    for item in items:
+        for batch in batches:
+            if all(other["id"] != item["id"] for other in batch):
+                batch.append(item)
+                break
+        else:
+            batches.append([item])
+    return batches
+
+
+def run(items: List[dict], output_dir: str, data_type: str = "excel", connections: int = 4,
+        processes: Optional[int] = None, force: bool = False, log = print) -> List[dict]:
+    """
+    Выгружает элементы манифеста в output_dir
+
+    :param items: элементы из read_manifest
+    :param output_dir: каталог для файлов
+    :param data_type: формат загрузки с fedstat.ru ("excel" или "sdmx")
+    :param connections: число одновременных загрузок
+    :param processes: число процессов обработки (None - по числу ядер, 0 - в текущем процессе)
+    :param force: выгружать заново уже готовые файлы
+    :param log: функция для сообщений о ходе выгрузки
+    :return: строки отчета: {id, name, status, rows, path, время шагов, error}
+    """
+    os.makedirs(output_dir, exist_ok = True)
+    report = {}
+    todo = []
+    for item in items:
+        path = output_path(output_dir, item)
+        if os.path.exists(path) and not force:
+            report[item["name"]] = {"id": item["id"], "name": item["name"], "status": "skipped", "path": path}
+        else:
+            todo.append(item)
+    if len(todo) < len(items):
+        log(f"Пропущено готовых файлов: {len(items) - len(todo)}")
+
+    with ThreadPoolExecutor(max_workers = connections) as executor:
+        resolved = list(executor.map(_try_resolve, todo))
+
+    for batch in _batches([item for item, _ in resolved if item is not None]):
+        filter_ids = {item["id"]: ids for item, ids in resolved if item in batch}
+        writer = ExportWriter({item["id"]: (output_path(output_dir, item), item["format"]) for item in batch})
+        metrics = fa.MetricsCollector()
+        started = time.perf_counter()
+        results = fa.load_indicators(
+            [item["id"] for item in batch], filter_ids = filter_ids, data_type = data_type,
+            max_workers = connections, processes = processes, observers = [metrics],
+            progress = lambda indicator_id, stage: log(f"{indicator_id}: {stage}") if stage == "done" else None,
+            postprocess = writer
+        )
+        stages = _stage_times(metrics)
+        for item in batch:
+            result = results[item["id"]]
+            row = {"id": item["id"], "name": item["name"], **stages.get(item["id"], {})}
+            if isinstance(result, Exception):
+                row.update(status = "error", error = f"{type(result).__name__}: {result}")
+            else:
+                row.update(status = "done", **result)
+            report[item["name"]] = row
+        log(f"Пакет из {len(batch)} индикаторов: {time.perf_counter() - started:.1f} с")
+
+    for item, error in resolved:
+        if item is None:
+            report[error["name"]] = error
+    return [report[item["name"]] for item in items]
+
+
+def _try_resolve(item: dict):
+    try:
+        return item, resolve_filter_ids(item)
+    except Exception as e:
+        return None, {"id": item["id"], "name": item["name"], "status": "error",
+                      "error": f"{type(e).__name__}: {e}"}
+
+
+def _stage_times(metrics: fa.MetricsCollector) -> dict:
+    """
+    Суммирует время шагов по индикаторам: load, process (все шаги обработки) и export
+    """
+    times = {}
+    for event in metrics.events:
+        if event["stage"] == "load":
+            column = "load"
+        elif event["stage"] == "postprocess":
+            column = "export"
+        else:
+            column = "process"
+        row = times.setdefault(event["indicator_id"], {"load": 0.0, "process": 0.0, "export": 0.0})
+        row[column] += event["wall_time"]
+    return times
+
+
+def format_summary(rows: List[dict]) -> str:
+    """
+    Возвращает таблицу отчета: строка на индикатор
+    """
+    columns = ["name", "id", "status", "rows", "load", "process", "export"]
+    lines = [[str(column) for column in columns]]
+    for row in rows:
+        lines.append([
+            f"{row[column]:.2f}" if isinstance(row.get(column), float) else str(row.get(column, ""))
+            for column in columns
+        ])
+    widths = [max(len(line[i]) for line in lines) for i in range(len(columns))]
+    text = ["  ".join(value.ljust(width) for value, width in zip(line, widths)) for line in lines]
+    text += [f"{row['name']}: {row['error']}" for row in rows if row.get("error")]
+    return "\n".join(text)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Пакетная выгрузка индикаторов fedstat.ru")
+    parser.add_argument("manifest", help = "JSON-файл со списком индикаторов")
+    parser.add_argument("--output-dir", default = "exports", help = "каталог для файлов")
+    parser.add_argument("--format", choices = list(fa.EXPORT_FORMATS), help = "формат файлов по умолчанию")
+    parser.add_argument("--data-type", default = "excel", choices = ["excel", "sdmx"], help = "формат загрузки с fedstat.ru")
+    parser.add_argument("--connections", type = int, default = 4, help = "число одновременных загрузок")
+    parser.add_argument("--processes", type = int, default = None, help = "число процессов обработки (0 - без пула)")
+    parser.add_argument("--force", action = "store_true", help = "выгрузить заново уже готовые файлы")
+    parser.add_argument("--summary", help = "сохранить отчет в JSON-файл")
+    args = parser.parse_args(argv)
+
+    items = read_manifest(args.manifest, args.format)
+    rows = run(items, args.output_dir, data_type = args.data_type, connections = args.connections,
+               processes = args.processes, force = args.force)
+    print(format_summary(rows))
+    if args.summary:
+        with open(args.summary, "w", encoding = "utf-8") as f:
+            json.dump(rows, f, ensure_ascii = False, indent = 2)
+    return 1 if any(row["status"] == "error" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
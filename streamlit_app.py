@@ -1,9 +1,8 @@
 import streamlit as st
-import numpy as np
-import pandas as pd
-from fedstat_api import FedStatIndicator
-from io import BytesIO
-import sys
+from fedstat_api import FedStatIndicator, load_indicators, combine_sum, fill_missing_years, export_dataframe, EXPORT_FORMATS, PROCESSING_STAGES, PipelineObserver
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 
 
 #Блок функций
@@ -21,126 +20,205 @@ def display_and_download(df, indicator_title):
                 height=400
             )
 
-            col1, col2 = st.columns([0.05, 0.4])
-            encoding = 'windows-1251'
-            with col1:
-                buffer = BytesIO()
-                with pd.ExcelWriter(buffer) as writer:
-                    st.session_state.df.to_excel(writer, index = False)
-                buffer.seek(0)
-                if st.download_button(
-                    label = "Скачать Excel",
-                    data = buffer.getvalue(),
-                    file_name = f"{indicator_title}.xlsx"
-                ):
-                    return None
-
-            with col2:
+            export_format = st.radio(
+                "Формат файла",
+                options = list(EXPORT_FORMATS.keys()),
+                format_func = lambda key: EXPORT_FORMATS[key]["label"],
+                horizontal = True
+            )
+            if st.button("Подготовить файл"):
+                st.session_state.export_format = export_format
+            if st.session_state.get("export_format") == export_format:
+                with st.spinner("Подготовка файла..."):
+                    data = export_dataframe(df, export_format)
                 if st.download_button(
-                    label = "Скачать CSV",
-                    data = st.session_state.df.to_csv(encoding = encoding, index = False),
-                    file_name = f"{indicator_title}.csv"
+                    label = f"Скачать {EXPORT_FORMATS[export_format]['label']}",
+                    data = data,
+                    file_name = f"{indicator_title}.{export_format}",
+                    mime = EXPORT_FORMATS[export_format]["mime"]
                 ):
-                    st.session_state.df = None
-                    st.rerun()
+                    st.session_state.export_format = None
                     return None
             return df
 def get_selectbox_args(indicator):
 
-    selectbox_values = indicator.filter_codes
-    options = indicator.filter_categories
+    catalog = indicator.filter_catalog
         
-    selected_values = []
+    values_to_pass = []
 
     col1, col2 = st.columns([0.5, 1])
-    for key, val in selectbox_values.items():
-        sb_options = list(options.get(key).values())
-        if len(sb_options) > 1:
-            all_options = ["Выбрать все"] + sb_options
+    for dimension in catalog.values():
+        if len(dimension) > 1:
+            all_options = ["Выбрать все"] + list(dimension.labels)
             with col1:
-                selected = st.multiselect(val, options = all_options, default = all_options[0], placeholder = "Выберите один или несколько вариантов")
+                selected = st.multiselect(dimension.title, options = all_options, default = all_options[0], placeholder = "Выберите один или несколько вариантов")
                     
             if "Выбрать все" in selected:
-                selected = sb_options
-            selected_values.append(selected)
+                values_to_pass.extend(dimension.ids)
+            else:
+                values_to_pass.extend(dimension.ids_of(selected))
         else:
-            selected_values.append(sb_options)
-    options_dict = {}
-    for option in options.values():
-        options_dict.update(option)
-
-    values_to_pass = []  
-    for selected_list in selected_values:
-        for value in selected_list:
-            for k, v in options_dict.items():
-                if v == value:
-                    values_to_pass.append(k)
+            values_to_pass.extend(dimension.ids)
     return values_to_pass
 
-def remove_differences(df1, df2):
-    df_1, df_2 = df1.copy(), df2.copy()
-    df1_size, df2_size = df1.shape[0], df2.shape[0]
-    if df1_size == df2_size:
-        return df_1, df_2
-
-    key_columns = df1.columns[:3]
-    bigger_df, smaller_df = (df_1, df_2) if df1_size > df2_size else (df_2, df_1) 
 
-    diff = bigger_df[key_columns].merge(smaller_df[key_columns], how='outer', indicator=True)
-    diff_values = diff[diff['_merge'] == 'left_only']
-
-    mask = bigger_df[key_columns].apply(tuple, axis=1).isin(
-        diff_values[key_columns].apply(tuple, axis=1)
-    )
-    bigger_df = bigger_df[~mask]
-
-    if df1_size > df2_size:
-        df_1, df_2 = bigger_df, smaller_df
+STAGE_LABELS = {
+    "load": "Загрузка данных с fedstat.ru",
+    "process": "Обработка данных",
+    "partitions": "Обработка данных по частям",
+    "preprocess": "Очистка данных",
+    "remove_districts": "Удаление федеральных округов",
+    "impute": "Заполнение пропущенных лет",
+    "change_districts": "Пересчет федеральных округов",
+    "mid_year": "Расчет значений на середину года",
+    "postprocess": "Подготовка результата",
+    "combine": "Объединение показателей",
+    "done": "Готово",
+}
+
+# Порядок шагов для полосы прогресса: шаги обработки fedstat_api и шаги приложения
+STAGE_ORDER = list(dict.fromkeys(["load", "process", *PROCESSING_STAGES, "postprocess", "combine", "done"]))
+
+
+class StageProgress(PipelineObserver):
+    """
+    Передает начало каждого шага загрузки и обработки в функцию progress(stage)
+    """
+
+    def __init__(self, progress):
+        self.progress = progress
+
+    def stage_started(self, event):
+        self.progress(event["stage"])
+
+
+class BackgroundJobs:
+    """
+    Фоновые загрузки, общие для всех сессий приложения.
+    Одинаковые запросы (по ключу) выполняются один раз, готовые таблицы
+    хранятся в памяти процесса не дольше ttl секунд (как ответы в кэше fedstat_api)
+    и вытесняются по объему (давно не запрашиваемые - первыми).
+    """
+
+    def __init__(self, max_workers = 2, max_bytes = 1024 ** 3, ttl = 24 * 60 * 60):
+        self._executor = ThreadPoolExecutor(max_workers = max_workers)
+        self._jobs = {}
+        self._results = {}
+        self._size = 0
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        """
+        Удаляет устаревшие таблицы (вызывается под self._lock)
+        """
+        if self.ttl is None:
+            return
+        now = time.time()
+        for key in [key for key, (_, _, created) in self._results.items() if now - created > self.ttl]:
+            _, size, _ = self._results.pop(key)
+            self._size -= size
+
+    def submit(self, key, loader):
+        """
+        Запускает loader(progress) в фоне, если результата с таким ключом еще нет
+        """
+        with self._lock:
+            self._expire()
+            if key in self._results:
+                self._results[key] = self._results.pop(key)
+                return
+            job = self._jobs.get(key)
+            if job is not None and not job["future"].done():
+                return
+            job = {"stage": "load", "future": None}
+            self._jobs[key] = job
+            job["future"] = self._executor.submit(self._run, key, job, loader)
+
+    def _run(self, key, job, loader):
+        def progress(stage):
+            job["stage"] = stage
+        df = loader(progress)
+        size = int(df.memory_usage(index = True, deep = True).sum())
+        with self._lock:
+            self._expire()
+            if size <= self.max_bytes:
+                self._results[key] = (df, size, time.time())
+                self._size += size
+                while self._size > self.max_bytes:
+                    _, evicted_size, _ = self._results.pop(next(iter(self._results)))
+                    self._size -= evicted_size
+                self._jobs.pop(key, None)
+        return df
+
+    def status(self, key):
+        """
+        Возвращает состояние запроса: {"stage", "result", "error"}; None - запрос неизвестен
+        """
+        with self._lock:
+            self._expire()
+            if key in self._results:
+                return {"stage": "done", "result": self._results[key][0], "error": None}
+            job = self._jobs.get(key)
+        if job is None:
+            return None
+        future = job["future"]
+        if future is not None and future.done():
+            with self._lock:
+                self._jobs.pop(key, None)
+            error = future.exception()
+            if error is not None:
+                return {"stage": "done", "result": None, "error": error}
+            return {"stage": "done", "result": future.result(), "error": None}
+        return {"stage": job["stage"], "result": None, "error": None}
+
+
+@st.cache_resource
+def get_background_jobs():
+    return BackgroundJobs()
+
+
+@st.cache_resource(max_entries = 32)
+def get_indicator(indicator_id):
+    """
+    Индикатор с загруженными фильтрами, общий для всех сессий (используется только для метаданных)
+    """
+    return FedStatIndicator(indicator_id)
+
+
+def start_job(key, title, loader):
+    get_background_jobs().submit(key, loader)
+    st.session_state.job = {"key": key, "title": title}
+
+
+def show_job():
+    """
+    Показывает ход фоновой загрузки текущей сессии; по готовности кладет таблицу в st.session_state.df
+    """
+    job = st.session_state.get("job")
+    if job is None:
+        return
+    status = get_background_jobs().status(job["key"])
+    if status is None:
+        st.session_state.job = None
+        return
+    if status["error"] is not None:
+        st.session_state.job = None
+        st.write(f"Ошибка загрузки данных: {status['error']}")
+    elif status["result"] is not None:
+        st.session_state.job = None
+        st.session_state.df = status["result"]
+        st.session_state.indicator_title = job["title"]
+        st.success("Данные успешно загружены!")
     else:
-        df_2, df_1 = bigger_df, smaller_df
-
-    if len(df_1) != len(df_2):
-        raise ValueError(
-            f"Размеры не совпали после обработки: df1={len(df_1)}, df2={len(df_2)}. "
-            "Возможно, в данных есть дубликаты ключевых колонок."
+        stage = status["stage"]
+        st.progress(
+            STAGE_ORDER.index(stage) / (len(STAGE_ORDER) - 1) if stage in STAGE_ORDER else 0.0,
+            text = STAGE_LABELS.get(stage, stage)
         )
-    return df_1, df_2
-
-def fill_missing_column(df_men, df_women):
-    df_men = df_men.copy()
-    df_rel = df_men.select_dtypes(include = ['object']).copy()
-    year_cols = [col for col in df_men.columns if "end" in col]
-
-    for col in year_cols:
-        df_rel[col] = df_men[col] / df_women[col].replace(0, np.nan)
-    df_rel['age_category'] = df_men['age_category']
-    
-    mean_2021 = (df_rel['2020end'] + df_rel['2022end']) / 2
-    df_rel["2021end"] = df_rel["2021end"].fillna(mean_2021)
-    men_2021 = df_women["2021end"] * df_rel["2021end"]
-    men_2021 = men_2021.replace([np.inf, -np.inf], np.nan)
-    df_men["2021end"] = df_men["2021end"].astype("float")
-    df_men["2021end"] = df_men["2021end"].fillna(men_2021)
-
-    df_men["2022mid"] = (df_men["2022end"] + df_men["2021end"]) / 2
-    df_men["2021mid"] = (df_men["2021end"] + df_men["2020end"]) / 2
-    return df_men
-
-
-def total_sum(df_men, df_women):
-    df_men = df_men.copy()
-    df_women = df_women.copy()
-    df_men = df_men.reset_index(drop = True)
-    df_women = df_women.reset_index(drop = True)
-
-    df_all = pd.DataFrame()
-    year_cols = [col for col in df_men.columns if "end" in col or "mid" in col]
-    for col in df_men.columns:
-        if col in year_cols:
-            df_all[col] = df_men[col] + df_women[col]
-        else:
-            df_all[col] = df_men[col]
-    return df_all
+        time.sleep(1)
+        st.rerun()
 
 
 if "show_block_1" not in st.session_state:
@@ -203,42 +281,56 @@ if st.session_state.show_block_2:
         }
         if gender != "Все":
             try:
-                indicator_1 = FedStatIndicator(gender_codes.get(gender))
+                indicator_1 = get_indicator(gender_codes.get(gender))
                 
             except Exception as e:
                 print(f"Ошибка загрузки данных: {e}")
         else:
             try:
-                indicator_1 = FedStatIndicator(gender_codes.get("Мужчины"))
-                indicator_2 = FedStatIndicator(gender_codes.get("Женщины"))
+                indicator_1 = get_indicator(gender_codes.get("Мужчины"))
+                indicator_2 = get_indicator(gender_codes.get("Женщины"))
             except Exception as e:
                 st.write(f"Ошибка загрузки данных: {e}")
 
         values_to_pass = get_selectbox_args(indicator_1)
 
         if st.button("Загрузить данные"):
-            with st.spinner("Загрузка данных... Это может занять до 10 минут"):
-                if gender != "Все":
-                    st.write(indicator_1.indicator_title)
-                    indicator_title = indicator_1.indicator_title
-                    st.session_state.df = indicator_1.get_processed_data(filter_ids = values_to_pass)
-                    st.success("Данные успешно загружены!")
-                if gender == "Все":
-                    st.write(f"{indicator_1.indicator_title} / {indicator_2.indicator_title}")
-                    try:
-                        df_men =indicator_1.get_processed_data(filter_ids = values_to_pass)
-                        df_women =indicator_2.get_processed_data(filter_ids = values_to_pass)
-                        indicator_title = "Численность всего населения"
-                        df_men, df_women = remove_differences(df_men, df_women)
-                        df_men = fill_missing_column(df_men, df_women)
-                        df_all = total_sum(df_men, df_women)
-                        st.session_state.df = df_all
-                        st.success("Данные успешно загружены!")
-                    except Exception as e:
-                        print(f"Ошибка обработки данных: {e}")
+            if gender != "Все":
+                indicator_id = gender_codes.get(gender)
+                start_job(
+                    (indicator_id, tuple(sorted(values_to_pass))),
+                    indicator_1.indicator_title,
+                    lambda progress: FedStatIndicator(indicator_id).get_processed_data(
+                        filter_ids = values_to_pass, progress = progress
+                    )
+                )
+            if gender == "Все":
+                st.write(f"{indicator_1.indicator_title} / {indicator_2.indicator_title}")
+
+                def load_all(progress):
+                    results = load_indicators(
+                        [gender_codes.get("Мужчины"), gender_codes.get("Женщины")],
+                        filter_ids = values_to_pass,
+                        processes = 0,
+                        observers = [StageProgress(progress)]
+                    )
+                    for result in results.values():
+                        if isinstance(result, Exception):
+                            raise result
+                    df_men, df_women = results.values()
+                    progress("combine")
+                    df_men = fill_missing_years(df_men, df_women)
+                    return combine_sum(df_men, df_women)
+
+                start_job(
+                    ("Все", tuple(sorted(values_to_pass))),
+                    "Численность всего населения",
+                    load_all
+                )
+        show_job()
             
         if "df" in st.session_state and st.session_state.df is not None:
-            result = display_and_download(st.session_state.df, indicator_title )
+            result = display_and_download(st.session_state.df, st.session_state.get("indicator_title"))
             if result is None:
                 st.session_state.df = None
                 st.rerun()
@@ -250,7 +342,7 @@ if st.session_state.show_block_3:
                 unsafe_allow_html=True
             )
         try:
-            birth_num = FedStatIndicator(indicator_id = "59992")
+            birth_num = get_indicator("59992")
         except Exception as e:
                 st.write(f"Ошибка загрузки данных: {e}")
 
@@ -260,15 +352,17 @@ if st.session_state.show_block_3:
 
 
         if st.button("Загрузить данные"):
-            with st.spinner("Загрузка данных... Это может занять до 10 минут"):
-                try:
-                    st.session_state.df = birth_num.get_processed_data(filter_ids = values_to_pass)
-                except Exception as e:
-                    print(f"Ошибка обработки данных: {e}")
+            start_job(
+                ("59992", tuple(sorted(values_to_pass))),
+                birth_num.indicator_title,
+                lambda progress: FedStatIndicator("59992").get_processed_data(
+                    filter_ids = values_to_pass, progress = progress
+                )
+            )
+        show_job()
 
         if "df" in st.session_state and st.session_state.df is not None:
             result = display_and_download(st.session_state.df, birth_num.indicator_title)
             if result is None:
                 st.session_state.df = None
-                st.rerun()
-         
+                st.rerun()
\ No newline at end of file